@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, union_all
+from sqlmodel import Session, select
+
+from models.orders import Order, OrderItem, VOID_ORDER_STATUSES
+from models.products import Product, ProductOrderStats, ProductResponse
+from models.providers import ProviderProductStats
+
+
+def order_lines(
+    product_ids: Optional[Iterable[int]] = None,
+    since: Optional[datetime] = None,
+    exclude_void: bool = False
+):
+    """
+    Every order line as (order_id, product_id, status, created_at, units, amount).
+
+    A single-product order is one line, a checkout order contributes one
+    line per order item. Filters are applied inside both halves of the
+    UNION ALL so each can use its own index.
+    """
+    single = (
+        select(
+            Order.id.label("order_id"),
+            Order.product_id.label("product_id"),
+            Order.status.label("status"),
+            Order.created_at.label("created_at"),
+            Order.quantity.label("units"),
+            Order.total_amount.label("amount")
+        )
+        .where(Order.product_id.is_not(None))
+    )
+    items = (
+        select(
+            OrderItem.order_id,
+            OrderItem.product_id,
+            Order.status,
+            Order.created_at,
+            OrderItem.quantity,
+            OrderItem.amount
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+    )
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        single = single.where(Order.product_id.in_(product_ids))
+        items = items.where(OrderItem.product_id.in_(product_ids))
+    if since is not None:
+        single = single.where(Order.created_at >= since)
+        items = items.where(Order.created_at >= since)
+    if exclude_void:
+        single = single.where(Order.status.not_in(VOID_ORDER_STATUSES))
+        items = items.where(Order.status.not_in(VOID_ORDER_STATUSES))
+    return union_all(single, items).subquery("order_lines")
+
+
+def product_order_stats(session: Session, product_ids: Iterable[int]) -> Dict[int, ProductOrderStats]:
+    """
+    Order count, units, revenue and last order date for a page of products.
+
+    One grouped query for the whole page, counting both single-product
+    orders and checkout lines; products without orders get zeroed stats.
+    Void (cancelled/refunded/failed) orders are left out.
+    """
+    product_ids = list(product_ids)
+    stats = {product_id: ProductOrderStats() for product_id in product_ids}
+    if not product_ids:
+        return stats
+
+    lines = order_lines(product_ids=product_ids, exclude_void=True)
+    statement = (
+        select(
+            lines.c.product_id,
+            func.count(lines.c.order_id),
+            func.coalesce(func.sum(lines.c.units), 0),
+            func.coalesce(func.sum(lines.c.amount), 0.0),
+            func.max(lines.c.created_at)
+        )
+        .group_by(lines.c.product_id)
+    )
+    for product_id, order_count, units, revenue, last_order_at in session.exec(statement).all():
+        stats[product_id] = ProductOrderStats(
+            order_count=order_count,
+            units=units,
+            revenue=revenue,
+            last_order_at=last_order_at
+        )
+    return stats
+
+
+def provider_product_stats(session: Session, provider_ids: Iterable[int]) -> Dict[int, ProviderProductStats]:
+    """Product count, active product count and units in stock for a page of providers, in one grouped query"""
+    provider_ids = list(provider_ids)
+    stats = {provider_id: ProviderProductStats() for provider_id in provider_ids}
+    if not provider_ids:
+        return stats
+
+    statement = (
+        select(
+            Product.provider_id,
+            func.count(Product.id),
+            func.coalesce(func.sum(case((Product.is_active, 1), else_=0)), 0),
+            func.coalesce(func.sum(Product.quantity), 0)
+        )
+        .where(Product.provider_id.in_(provider_ids))
+        .group_by(Product.provider_id)
+    )
+    for provider_id, product_count, active_count, stock_units in session.exec(statement).all():
+        stats[provider_id] = ProviderProductStats(
+            product_count=product_count,
+            active_count=active_count,
+            stock_units=stock_units
+        )
+    return stats
+
+
+def provider_products(session: Session, provider_ids: Iterable[int], per_provider: int) -> Dict[int, List[ProductResponse]]:
+    """
+    The newest `per_provider` products of each provider in a page.
+
+    One query: a ROW_NUMBER() window partitioned by provider keeps the
+    first rows of each provider, instead of a lazy load per provider.
+    """
+    provider_ids = list(provider_ids)
+    products: Dict[int, List[ProductResponse]] = {provider_id: [] for provider_id in provider_ids}
+    if not provider_ids or per_provider <= 0:
+        return products
+
+    ranked = (
+        select(
+            *Product.__table__.columns,
+            func.row_number().over(partition_by=Product.provider_id, order_by=Product.id.desc()).label("position")
+        )
+        .where(Product.provider_id.in_(provider_ids))
+        .subquery()
+    )
+    columns = [ranked.c[column.name] for column in Product.__table__.columns]
+    rows = session.exec(
+        select(*columns).where(ranked.c.position <= per_provider).order_by(ranked.c.provider_id, ranked.c.position)
+    ).all()
+    for row in rows:
+        products[row.provider_id].append(ProductResponse.model_validate(dict(row._mapping)))
+    return products
@@ -0,0 +1,143 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+from starlette.config import Config
+
+from models.analytics import CatalogAnalyticsResponse, GroupRevenue, LowStockProduct
+from aggregates import order_lines
+from models.products import Product
+
+config = Config(".env")
+
+ANALYTICS_CACHE_SECONDS = config("ANALYTICS_CACHE_SECONDS", cast=float, default=300.0)
+
+PERCENTILES = {"min": 0, "p10": 10, "p25": 25, "median": 50, "p75": 75, "p90": 90, "p99": 99, "max": 100}
+
+# Column positions in the product matrix
+ID, PRICE, QUANTITY, CATEGORY, PROVIDER, ACTIVE = range(6)
+# Position of the order line columns
+ORDER_ID, ORDER_PRODUCT, ORDER_UNITS, ORDER_AMOUNT = range(4)
+
+_cache: Dict[Tuple, Tuple[float, CatalogAnalyticsResponse]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_product_matrix(session: Session) -> np.ndarray:
+    """
+    All products as one float matrix, one row per product ordered by id.
+
+    NULLs are mapped in SQL so the driver rows convert in a single call:
+    price and quantity become -1 (no price / untracked stock) and missing
+    category/provider ids become 0.
+    """
+    rows = session.exec(
+        select(
+            Product.id,
+            func.coalesce(Product.price, -1.0),
+            func.coalesce(Product.quantity, -1),
+            func.coalesce(Product.category_id, 0),
+            func.coalesce(Product.provider_id, 0),
+            Product.is_active
+        ).order_by(Product.id)
+    ).all()
+    return np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+
+def load_order_matrix(session: Session) -> np.ndarray:
+    """(order_id, product_id, units, amount) of every order line that counts as a sale"""
+    lines = order_lines(exclude_void=True)
+    rows = session.exec(
+        select(lines.c.order_id, lines.c.product_id, lines.c.units, lines.c.amount)
+    ).all()
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+
+def _revenue_by(keys: np.ndarray, orders: np.ndarray) -> List[GroupRevenue]:
+    if len(keys) == 0:
+        return []
+    groups, inverse = np.unique(keys, return_inverse=True)
+    # A checkout order with several lines in one group still counts once
+    pairs = np.unique(np.column_stack((inverse, orders[:, ORDER_ID])), axis=0)
+    counts = np.bincount(pairs[:, 0].astype(np.intp), minlength=len(groups))
+    units = np.bincount(inverse, weights=orders[:, ORDER_UNITS], minlength=len(groups))
+    revenue = np.bincount(inverse, weights=orders[:, ORDER_AMOUNT], minlength=len(groups))
+    result = [
+        GroupRevenue(
+            id=int(group) or None,
+            orders=int(count),
+            units=int(unit_total),
+            revenue=round(float(amount), 2)
+        )
+        for group, count, unit_total, amount in zip(groups, counts, units, revenue)
+    ]
+    return sorted(result, key=lambda item: item.revenue, reverse=True)
+
+
+def compute_catalog_analytics(session: Session, low_stock_threshold: int, low_stock_limit: int) -> CatalogAnalyticsResponse:
+    products = load_product_matrix(session)
+    orders = load_order_matrix(session)
+
+    price = products[:, PRICE]
+    quantity = products[:, QUANTITY]
+    active = products[:, ACTIVE] > 0
+    priced = price >= 0
+    tracked = quantity >= 0
+
+    in_stock = tracked & (quantity > 0)
+    stock_value = float(np.sum(price[in_stock & priced] * quantity[in_stock & priced]))
+
+    # Attribute orders to the category/provider of their product
+    product_ids = products[:, ID]
+    positions = np.searchsorted(product_ids, orders[:, ORDER_PRODUCT])
+    positions = np.clip(positions, 0, max(len(product_ids) - 1, 0))
+    known = (product_ids[positions] == orders[:, ORDER_PRODUCT]) if len(product_ids) else np.zeros(len(orders), dtype=bool)
+    known_orders = orders[known]
+    known_positions = positions[known]
+
+    percentiles = {}
+    if priced.any():
+        values = np.percentile(price[priced], list(PERCENTILES.values()))
+        percentiles = {name: round(float(value), 2) for name, value in zip(PERCENTILES, values)}
+
+    low = np.flatnonzero(active & tracked & (quantity <= low_stock_threshold))
+    low_stock_count = len(low)
+    low = low[np.lexsort((product_ids[low], quantity[low]))][:low_stock_limit]
+    low_ids = [int(product_id) for product_id in product_ids[low]]
+    names = dict(session.exec(select(Product.id, Product.name).where(Product.id.in_(low_ids))).all()) if low_ids else {}
+
+    return CatalogAnalyticsResponse(
+        message="Catalog analytics computed successfully",
+        generated_at=datetime.now(),
+        product_count=len(products),
+        active_product_count=int(np.count_nonzero(active)),
+        stock_units=int(np.sum(quantity[in_stock])),
+        stock_value=round(stock_value, 2),
+        order_count=len(np.unique(orders[:, ORDER_ID])),
+        units_sold=int(np.sum(orders[:, ORDER_UNITS])),
+        revenue_total=round(float(np.sum(orders[:, ORDER_AMOUNT])), 2),
+        revenue_by_category=_revenue_by(products[known_positions, CATEGORY], known_orders),
+        revenue_by_provider=_revenue_by(products[known_positions, PROVIDER], known_orders),
+        price_percentiles=percentiles,
+        low_stock_count=low_stock_count,
+        low_stock=[
+            LowStockProduct(id=product_id, name=names.get(product_id, ""), quantity=int(units))
+            for product_id, units in zip(low_ids, quantity[low])
+        ]
+    )
+
+
+def catalog_analytics(session: Session, low_stock_threshold: int = 5, low_stock_limit: int = 20) -> CatalogAnalyticsResponse:
+    """Catalog analytics, recomputed at most once per ANALYTICS_CACHE_SECONDS"""
+    key = (low_stock_threshold, low_stock_limit)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        result = compute_catalog_analytics(session, low_stock_threshold, low_stock_limit)
+        _cache[key] = (time.monotonic() + ANALYTICS_CACHE_SECONDS, result)
+        return result
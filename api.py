@@ -124,6 +124,8 @@ async def scrape_website(
             "images": [],
             "text_content": None,
             "custom_data": {},
+            # Selectors that failed, by name; their custom_data value is None
+            "custom_data_errors": {},
             "scraped_at": datetime.now().isoformat(),
             "location": None
         }
@@ -196,7 +198,8 @@ async def scrape_website(
                             else:
                                 result["custom_data"][key] = [elem.get_text(strip=True) for elem in soup_elements]
                 except Exception as e:
-                    result["custom_data"][key] = f"Error extracting {key}: {str(e)}"
+                    result["custom_data"][key] = None
+                    result["custom_data_errors"][key] = str(e)
         
         return result
         
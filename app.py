@@ -5,7 +5,13 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from database import connect_to_database, disconnect_from_database
 from main_router import router, web_router
-from websocket import router as websocket_router
+from websocket import router as websocket_router, manager as websocket_manager
+from catalog_cache import catalog_cache
+from provider_feeds import feed_scheduler
+from idempotency import idempotency
+from chat_store import backfill_conversation_keys, chat_writer, run_chat_db
+from unread_counters import rebuild_unread_counters, unread_counters
+from room_members import room_members
 import time 
 import os
 
@@ -14,8 +20,16 @@ async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events"""
     # Startup
     await connect_to_database()
+    await run_chat_db(backfill_conversation_keys)
+    await run_chat_db(rebuild_unread_counters)
+    feed_scheduler.start()
+    await websocket_manager.start()
+    chat_writer.start()
     yield
     # Shutdown
+    await chat_writer.stop()
+    await websocket_manager.stop()
+    await feed_scheduler.stop()
     await disconnect_from_database()
 
 def custom_openapi():
@@ -121,6 +135,31 @@ def create_application() -> FastAPI:
             "message": "API is running",
             "timestamp": time.time()
         }
+
+    @app.get("/metrics/catalog-cache")
+    def catalog_cache_metrics():
+        return catalog_cache.stats()
+
+    @app.get("/metrics/idempotency")
+    def idempotency_metrics():
+        return idempotency.stats()
+
+    # Runs on the event loop, which owns the connection state
+    @app.get("/metrics/websocket")
+    async def websocket_metrics():
+        return websocket_manager.stats()
+
+    @app.get("/metrics/chat-writer")
+    async def chat_writer_metrics():
+        return chat_writer.stats()
+
+    @app.get("/metrics/unread-counters")
+    def unread_counter_metrics():
+        return unread_counters.stats()
+
+    @app.get("/metrics/room-members")
+    def room_member_metrics():
+        return room_members.stats()
     
     return app
     
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from starlette.config import Config
+
+config = Config(".env")
+
+CATALOG_CACHE_MAX_BYTES = config("CATALOG_CACHE_MAX_BYTES", cast=int, default=32 * 1024 * 1024)
+# Versions are per process, so the TTL bounds how long another worker's writes can go unseen
+CATALOG_CACHE_TTL = config("CATALOG_CACHE_TTL", cast=float, default=60.0)
+
+
+class _Flight:
+    """A computation in progress that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+
+
+class CatalogCache:
+    """
+    Read-through cache of serialized catalog responses.
+
+    Entries are keyed by endpoint, query parameters and the current version
+    of every table the response is built from. Write endpoints call `bump`
+    for the tables they change, which makes dependent entries unreachable
+    and drops them. Memory is bounded by evicting least recently used
+    entries once the stored payloads exceed `max_bytes`, and concurrent
+    misses for the same key wait for a single computation.
+    """
+
+    def __init__(self, max_bytes: int = CATALOG_CACHE_MAX_BYTES, ttl: float = CATALOG_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[bytes, float, Tuple[str, ...]]]" = OrderedDict()
+        self._inflight: Dict[Tuple, _Flight] = {}
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def bump(self, *tables: str) -> None:
+        """Invalidate everything built from any of `tables`"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            stale = [key for key, (_, _, deps) in self._entries.items() if set(deps) & set(tables)]
+            for key in stale:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _key(self, name: str, tables: Tuple[str, ...], params: Dict[str, Any]) -> Tuple:
+        versions = tuple(self._versions.get(table, 0) for table in tables)
+        return (name, tables, versions, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+    def _drop(self, key: Tuple) -> None:
+        payload, _, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _store(self, key: Tuple, payload: bytes, tables: Tuple[str, ...]) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (payload, time.monotonic() + self.ttl, tables)
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_compute(
+        self,
+        name: str,
+        tables: Iterable[str],
+        params: Dict[str, Any],
+        compute: Callable[[], Any]
+    ) -> bytes:
+        """Return the cached JSON payload, computing and storing it on a miss"""
+        tables = tuple(tables)
+        with self._lock:
+            key = self._key(name, tables, params)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.payload
+
+        try:
+            flight.payload = json.dumps(jsonable_encoder(compute()), separators=(",", ":")).encode()
+            with self._lock:
+                # Don't store a result that a concurrent write already made stale
+                if self._key(name, tables, params) == key:
+                    self._store(key, flight.payload, tables)
+            return flight.payload
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def response(self, name: str, tables: Iterable[str], params: Dict[str, Any], compute: Callable[[], Any]) -> Response:
+        return Response(content=self.get_or_compute(name, tables, params, compute), media_type="application/json")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "versions": dict(self._versions),
+            }
+
+
+catalog_cache = CatalogCache()
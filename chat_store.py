@@ -0,0 +1,274 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, case, cast, insert, literal, update
+from sqlmodel import Session
+from starlette.config import Config
+
+import database
+from database import insert_returning_ids
+from models.chats import Chat, ChatType, conversation_key
+from models.users import User, UserNotification
+from room_members import room_members
+from unread_counters import apply_unread_deltas, merge_deltas, notification_deltas, unread_counters
+
+config = Config(".env")
+
+# Threads reserved for chat writes, so they never wait behind (or starve) the request threadpool
+CHAT_DB_THREADS = config("CHAT_DB_THREADS", cast=int, default=4)
+# "direct" writes every message in its own transaction, "batched" group-commits them
+CHAT_WRITE_MODE = config("CHAT_WRITE_MODE", default="direct")
+CHAT_BATCH_MAX_MESSAGES = config("CHAT_BATCH_MAX_MESSAGES", cast=int, default=200)
+CHAT_BATCH_MAX_DELAY_MS = config("CHAT_BATCH_MAX_DELAY_MS", cast=float, default=20.0)
+CHAT_QUEUE_SIZE = config("CHAT_QUEUE_SIZE", cast=int, default=10000)
+# With batched writes: "commit" acks a socket message once it is stored,
+# "queue" acks as soon as it is buffered and sends the id after the commit
+CHAT_ACK_MODE = config("CHAT_ACK_MODE", default="commit")
+
+_executor = ThreadPoolExecutor(max_workers=CHAT_DB_THREADS, thread_name_prefix="chat-db")
+
+
+async def run_chat_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking chat database work on the chat executor"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+def chat_row(sender_id: int, message: str, receiver_id: Optional[int] = None,
+             chat_room_id: Optional[int] = None) -> Dict[str, Any]:
+    now = datetime.now()
+    return {
+        "message": message,
+        "message_type": ChatType.PRIVATE if receiver_id else ChatType.GROUP,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "chat_room_id": chat_room_id,
+        "conversation_key": conversation_key(sender_id, receiver_id, chat_room_id),
+        "is_read": False,
+        "delivered_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def chat_payload(chat_id: int, row: Dict[str, Any]) -> Dict[str, Any]:
+    """The stored message as delivered to clients"""
+    return {
+        "type": "chat_message",
+        "chat_id": chat_id,
+        "sender_id": row["sender_id"],
+        "receiver_id": row["receiver_id"],
+        "chat_room_id": row["chat_room_id"],
+        "message": row["message"],
+        "created_at": row["created_at"].isoformat(),
+    }
+
+
+def save_chat_batch(rows: List[Dict[str, Any]], recipients: List[Sequence[int]]) -> List[Dict[str, Any]]:
+    """
+    Store chat rows and their notifications in one transaction.
+
+    `recipients[i]` are the users notified of `rows[i]`. One multi-row
+    INSERT per table, and their unread counters change in the same
+    transaction. Blocking; returns the payloads in row order.
+    """
+    with Session(database.engine) as session:
+        ids = insert_returning_ids(session, Chat, rows)
+        notifications = [
+            {
+                "user_id": user_id,
+                "title": "New Message",
+                "message": row["message"][:100],
+                "notification_type": "chat",
+                "is_read": False,
+                "is_archived": False,
+                "related_chat_id": chat_id,
+                "sender_id": row["sender_id"],
+                "created_at": row["created_at"],
+            }
+            for chat_id, row, users in zip(ids, rows, recipients) for user_id in users
+        ]
+        deltas = merge_deltas(*(
+            notification_deltas(user_id, row["conversation_key"])
+            for row, users in zip(rows, recipients) for user_id in users
+        ))
+        if notifications:
+            session.exec(insert(UserNotification.__table__).values(notifications))
+            apply_unread_deltas(session, deltas)
+        session.commit()
+    unread_counters.apply(deltas)
+    return [chat_payload(chat_id, row) for chat_id, row in zip(ids, rows)]
+
+
+class ChatWriter:
+    """
+    Write-behind buffer that group-commits chat messages.
+
+    Messages are queued on the event loop and written by a single flusher
+    in batches of up to `max_batch` messages, waiting at most `max_delay_ms`
+    for a batch to fill. Each batch is one transaction; if it fails (say, an
+    unknown receiver) its messages are retried one by one so a bad message
+    only fails itself. `submit` returns a future resolving to the payload.
+    """
+
+    def __init__(self, max_batch: int = CHAT_BATCH_MAX_MESSAGES, max_delay_ms: float = CHAT_BATCH_MAX_DELAY_MS,
+                 queue_size: int = CHAT_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self._queue: "Optional[asyncio.Queue[Optional[Tuple[Dict, Sequence[int], asyncio.Future]]]]" = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.messages = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if CHAT_WRITE_MODE == "batched" and self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, row: Dict[str, Any], recipients: Sequence[int] = ()) -> "asyncio.Future[Dict[str, Any]]":
+        """Queue a chat row and the users to notify; waits only while the queue is full"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, recipients, future))
+        return future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Tuple[Dict, Sequence[int], asyncio.Future]]) -> None:
+        self.batches += 1
+        self.messages += len(batch)
+        try:
+            payloads = await run_chat_db(save_chat_batch, [row for row, _, _ in batch], [users for _, users, _ in batch])
+        except Exception:
+            self.fallbacks += 1
+            for row, users, future in batch:
+                try:
+                    payload = (await run_chat_db(save_chat_batch, [row], [users]))[0]
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if not future.done():
+                    future.set_result(payload)
+            return
+        for (_, _, future), payload in zip(batch, payloads):
+            # A waiter that went away (client disconnected) cancelled its future
+            if not future.done():
+                future.set_result(payload)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "batched" if self.enabled else "direct",
+            "ack_mode": CHAT_ACK_MODE,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "messages": self.messages,
+            "fallbacks": self.fallbacks,
+            "average_batch": self.messages / self.batches if self.batches else 0.0,
+        }
+
+
+chat_writer = ChatWriter()
+
+
+def chat_recipients(receiver_id: Optional[int] = None, notify_user_ids: Sequence[int] = ()) -> List[int]:
+    """Users notified of a message: the receiver of a private one, else `notify_user_ids`"""
+    return [receiver_id] if receiver_id else list(notify_user_ids)
+
+
+async def persist_chat_message(sender_id: int, message: str, receiver_id: Optional[int] = None,
+                               chat_room_id: Optional[int] = None,
+                               notify_user_ids: Sequence[int] = ()) -> Dict[str, Any]:
+    """Store a message off the event loop and return its payload once committed"""
+    row = chat_row(sender_id, message, receiver_id, chat_room_id)
+    recipients = chat_recipients(receiver_id, notify_user_ids)
+    if chat_writer.enabled:
+        return await (await chat_writer.submit(row, recipients))
+    return (await run_chat_db(save_chat_batch, [row], [recipients]))[0]
+
+
+async def load_unread_counts(user_id: int) -> Dict[str, int]:
+    """A user's unread counts, querying off the event loop on a miss"""
+    counts = unread_counters.peek(user_id)
+    if counts is None:
+        counts = await run_chat_db(unread_counters.get, user_id)
+    return counts
+
+
+async def load_room_members(room_id: int) -> Optional[FrozenSet[int]]:
+    """Members of a chat room (None if it doesn't exist), querying off the event loop on a miss"""
+    members = room_members.peek(room_id)
+    if members is None:
+        members = await run_chat_db(room_members.get, room_id)
+    return members
+
+
+def set_user_online(user_id: int, online: bool) -> None:
+    with Session(database.engine) as session:
+        user = session.get(User, user_id)
+        if user:
+            user.is_online = online
+            user.last_seen = datetime.now()
+            session.add(user)
+            session.commit()
+
+
+def backfill_conversation_keys() -> int:
+    """Set conversation_key on messages stored before it existed; returns the rows updated"""
+    table = Chat.__table__
+    sender, receiver = table.c.sender_id, table.c.receiver_id
+    low = case((sender < receiver, sender), else_=receiver)
+    high = case((sender < receiver, receiver), else_=sender)
+    missing = table.c.conversation_key.is_(None)
+    with Session(database.engine) as session:
+        updated = session.exec(
+            update(table).where(missing, receiver.is_not(None))
+            .values(conversation_key=literal("u:") + cast(low, String) + literal(":") + cast(high, String))
+        ).rowcount
+        updated += session.exec(
+            update(table).where(missing, receiver.is_(None), table.c.chat_room_id.is_not(None))
+            .values(conversation_key=literal("r:") + cast(table.c.chat_room_id, String))
+        ).rowcount
+        session.commit()
+    return updated
@@ -1,6 +1,10 @@
 from sqlmodel import SQLModel, create_engine, Session, select
+from sqlalchemy import insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from starlette.config import Config
 from models.users import User, UserRole
+from migrations import run_migrations
 import os
 
 config = Config(".env")
@@ -25,6 +29,43 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+def upsert_statement(session: Session, model, rows: list[dict], key_columns: list[str],
+                     update_columns: list[str] = (), increment_columns: list[str] = ()):
+    """
+    Multi-row insert that updates rows whose key already exists.
+
+    Uses INSERT ... ON DUPLICATE KEY UPDATE on MySQL and
+    INSERT ... ON CONFLICT DO UPDATE on SQLite. `update_columns` take the
+    incoming value, `increment_columns` add the incoming value to the stored one.
+    """
+    table = model.__table__
+    is_mysql = session.get_bind().dialect.name == "mysql"
+    statement = (mysql_insert if is_mysql else sqlite_insert)(table).values(rows)
+    incoming = statement.inserted if is_mysql else statement.excluded
+    changes = {column: incoming[column] for column in update_columns}
+    changes.update({column: table.c[column] + incoming[column] for column in increment_columns})
+    if is_mysql:
+        return statement.on_duplicate_key_update(changes)
+    return statement.on_conflict_do_update(index_elements=key_columns, set_=changes)
+
+def insert_returning_ids(session: Session, model, rows: list[dict]) -> list[int]:
+    """
+    Insert rows with a single round trip and return their ids in row order.
+
+    Uses INSERT ... RETURNING where the dialect supports it. MySQL has no
+    RETURNING, but a single multi-row INSERT gets consecutive auto-increment
+    ids (with the default auto_increment_increment of 1) and reports the
+    first one as lastrowid.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return [row[0] for row in session.exec(statement, params=rows)]
+    first_id = session.exec(insert(table).values(rows)).lastrowid
+    return list(range(first_id, first_id + len(rows)))
+
 def create_default_user():  
     from auth.password import hash_password
     
@@ -49,6 +90,7 @@ def create_default_user():
 
 async def connect_to_database():
     create_db_and_tables()
+    run_migrations(engine)
     try:
         create_default_user()
     except Exception as e:
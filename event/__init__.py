@@ -4,6 +4,10 @@ from .image_module import router as image_module_router
 from .product_module import router as product_module_router
 from .providers_module import router as providers_module_router
 from .orders_module import router as orders_module_router
+from .analytics_module import router as analytics_module_router
+from .reports_module import router as reports_module_router
+from .export_module import router as export_module_router
+from .promotion_module import router as promotion_module_router
 
 __all__ = [
     "user_module_router",
@@ -12,5 +16,9 @@ __all__ = [
     "product_module_router",
     "providers_module_router",
     "orders_module_router",
+    "analytics_module_router",
+    "reports_module_router",
+    "export_module_router",
+    "promotion_module_router",
     "web_router"
      ]    
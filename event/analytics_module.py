@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from models.analytics import CatalogAnalyticsResponse
+from database import get_session
+from auth.dependencies import require_role
+from models.users import UserRole
+from analytics import catalog_analytics
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"]
+)
+
+@router.get("/catalog", response_model=CatalogAnalyticsResponse,
+            dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))])
+def get_catalog_analytics(
+    low_stock_threshold: int = Query(5, ge=0),
+    low_stock_limit: int = Query(20, ge=1, le=200),
+    session: Session = Depends(get_session)
+):
+    """Stock value, sales per category/provider, price distribution and low-stock products"""
+    return catalog_analytics(session, low_stock_threshold, low_stock_limit)
@@ -3,6 +3,7 @@ from sqlmodel import Session, select
 from models.categories import Category, CategoryCreate, CategoryUpdate, CategoryResponse
 from models.images import Image, ImageData
 from database import get_session
+from catalog_cache import catalog_cache
 from datetime import datetime
 from auth.dependencies import require_role, oauth2_scheme
 from models.users import UserRole
@@ -17,6 +18,9 @@ router = APIRouter(
 
 @router.get("/get-categories", response_model=list[CategoryResponse])
 def get_categories(session: Session = Depends(get_session)):
+    return catalog_cache.response("categories", ("categories", "images"), {}, lambda: _list_categories(session))
+
+def _list_categories(session: Session) -> list[CategoryResponse]:
     categories = session.exec(select(Category)).all()
     category_ids = [cat.id for cat in categories]
     images = session.exec(select(Image).where(Image.category_id.in_(category_ids))).all() if category_ids else []
@@ -94,6 +98,7 @@ def create_category(category: CategoryCreate,
     session.add(new_category)
     session.commit()
     session.refresh(new_category)
+    catalog_cache.bump("categories")
     # Get images for this category (will be empty for new category)
     images = session.exec(select(Image).where(Image.category_id == new_category.id)).all()
     return CategoryResponse(
@@ -144,6 +149,7 @@ def update_category(category_id: int, category_update: CategoryUpdate, current_u
     session.add(category)
     session.commit()
     session.refresh(category)
+    catalog_cache.bump("categories")
     images = session.exec(select(Image).where(Image.category_id == category.id)).all()
     return CategoryResponse(
         id=category.id,
@@ -176,5 +182,6 @@ def delete_category(category_id: int, current_user: Annotated[User, Depends(get_
         )
     session.delete(category)
     session.commit()
+    catalog_cache.bump("categories")
     return None
 
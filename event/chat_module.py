@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlmodel import Session, select
 from typing import List, Optional
 from datetime import datetime
 
-from models.chats import Chat, ChatType, ChatRoom, ChatRoomParticipant
+from models.chats import Chat, ChatType, ChatRoom, ChatRoomParticipant, conversation_key
 from models.users import User, UserNotification
 from database import get_session
+from pagination import decode_cursor, encode_cursor, keyset_condition, order_by_clause
+from chat_store import persist_chat_message
+from room_members import room_members
+import notification_bulk
+from unread_counters import apply_unread_deltas, notification_deltas, unread_counters, unread_payload
 from auth.dependencies import get_current_active_user
 from typing import Annotated
 
@@ -16,27 +23,43 @@ router = APIRouter(prefix="/chat", tags=["websocket"])
 def get_messages(
     receiver_id: Optional[int] = None,
     chat_room_id: Optional[int] = None,
-    limit: int = 50,
-    offset: int = 0,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: Annotated[User, Depends(get_current_active_user)] = None,
     session: Session = Depends(get_session)
 ):
-    """Get chat messages for the current user"""
-    query = select(Chat).where(
-        (Chat.sender_id == current_user.id) | (Chat.receiver_id == current_user.id)
-    )
+    """
+    Get chat messages for the current user, oldest first.
+
+    Returns the latest `limit` messages of the conversation with
+    `receiver_id` or of room `chat_room_id` (all of the user's messages
+    without either). Pass the first message's id as `before_id` for older
+    messages, or the last one's as `after_id` for newer ones.
+    """
+    if chat_room_id and not receiver_id:
+        members = room_members.get(chat_room_id)
+        if members is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
+        if current_user.id not in members:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                                detail="You are not a participant of this chat room")
     
-    if receiver_id:
-        query = query.where(
-            ((Chat.sender_id == current_user.id) & (Chat.receiver_id == receiver_id)) |
-            ((Chat.sender_id == receiver_id) & (Chat.receiver_id == current_user.id))
+    key = conversation_key(current_user.id, receiver_id, chat_room_id)
+    if key:
+        query = select(Chat).where(Chat.conversation_key == key)
+    else:
+        query = select(Chat).where(
+            (Chat.sender_id == current_user.id) | (Chat.receiver_id == current_user.id)
         )
     
-    if chat_room_id:
-        query = query.where(Chat.chat_room_id == chat_room_id)
-    
-    query = query.order_by(Chat.created_at.desc()).limit(limit).offset(offset)
-    messages = session.exec(query).all()
+    if before_id:
+        query = query.where(Chat.id < before_id)
+    if after_id:
+        # Newer messages are read forwards from the cursor
+        messages = session.exec(query.where(Chat.id > after_id).order_by(Chat.id).limit(limit)).all()
+    else:
+        messages = list(reversed(session.exec(query.order_by(Chat.id.desc()).limit(limit)).all()))
     
     return [
         {
@@ -49,7 +72,7 @@ def get_messages(
             "is_read": msg.is_read,
             "created_at": msg.created_at.isoformat() if msg.created_at else None,
         }
-        for msg in reversed(messages)
+        for msg in messages
     ]
 
 
@@ -58,8 +81,7 @@ async def create_message(
     message: str,
     receiver_id: Optional[int] = None,
     chat_room_id: Optional[int] = None,
-    current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    session: Session = Depends(get_session)
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
 ):
     """Create a new chat message"""
     if not message:
@@ -68,96 +90,180 @@ async def create_message(
             detail="Message cannot be empty"
         )
     
-    chat = Chat(
-        message=message,
-        sender_id=current_user.id,
-        receiver_id=receiver_id,
-        chat_room_id=chat_room_id,
-        message_type=ChatType.PRIVATE if receiver_id else ChatType.GROUP,
-        is_read=False,
-        delivered_at=datetime.now()
-    )
+    from websocket import chat_audience, manager
+    try:
+        members, offline = await chat_audience(current_user.id, receiver_id, chat_room_id)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     
-    session.add(chat)
-    session.commit()
-    session.refresh(chat)
+    # Message and notifications are written in one transaction off the event loop
+    chat = await persist_chat_message(current_user.id, message, receiver_id, chat_room_id, offline)
     
-    # Send notification via WebSocket if receiver is online
-    from websocket import manager
-    await manager.send_chat_notification(chat)
+    # Send notification via WebSocket to the receiver or room members that are online
+    await manager.send_chat_notification(chat, room_member_ids=members, notified_ids=offline)
+    
+    return {
+        "id": chat["chat_id"],
+        "message": chat["message"],
+        "sender_id": chat["sender_id"],
+        "receiver_id": chat["receiver_id"],
+        "created_at": chat["created_at"],
+    }
+
+
+@router.post("/rooms", response_model=dict, status_code=status.HTTP_201_CREATED)
+def create_room(
+    name: str,
+    description: Optional[str] = None,
+    is_private: bool = False,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    session: Session = Depends(get_session)
+):
+    """Create a chat room; the creator joins it as its owner"""
+    room = ChatRoom(name=name, description=description, is_private=is_private, created_by_id=current_user.id)
+    session.add(room)
+    session.flush()
+    session.add(ChatRoomParticipant(chat_room_id=room.id, user_id=current_user.id, role="owner"))
+    session.commit()
+    session.refresh(room)
     
     return {
-        "id": chat.id,
-        "message": chat.message,
-        "sender_id": chat.sender_id,
-        "receiver_id": chat.receiver_id,
-        "created_at": chat.created_at.isoformat() if chat.created_at else None,
+        "id": room.id,
+        "name": room.name,
+        "description": room.description,
+        "is_private": room.is_private,
+        "created_by_id": room.created_by_id,
+        "created_at": room.created_at.isoformat() if room.created_at else None,
     }
 
 
-@router.get("/notifications", response_model=List[dict])
+def _join_room(session: Session, room_id: int, user_id: int) -> bool:
+    room = session.get(ChatRoom, room_id)
+    if not room:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat room not found")
+    if session.exec(select(ChatRoomParticipant.id).where(
+        ChatRoomParticipant.chat_room_id == room_id, ChatRoomParticipant.user_id == user_id
+    )).first():
+        return False
+    if room.is_private:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="This chat room is private")
+    session.add(ChatRoomParticipant(chat_room_id=room_id, user_id=user_id))
+    session.commit()
+    return True
+
+
+def _leave_room(session: Session, room_id: int, user_id: int) -> bool:
+    participant = session.exec(select(ChatRoomParticipant).where(
+        ChatRoomParticipant.chat_room_id == room_id, ChatRoomParticipant.user_id == user_id
+    )).first()
+    if not participant:
+        return False
+    session.delete(participant)
+    session.commit()
+    return True
+
+
+@router.post("/rooms/{room_id}/join", response_model=dict)
+async def join_room(
+    room_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    session: Session = Depends(get_session)
+):
+    """Join a public chat room"""
+    joined = await run_in_threadpool(_join_room, session, room_id, current_user.id)
+    if joined:
+        from websocket import manager
+        await manager.invalidate_room(room_id)
+    return {"message": "Joined chat room" if joined else "Already a participant"}
+
+
+@router.post("/rooms/{room_id}/leave", response_model=dict)
+async def leave_room(
+    room_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    session: Session = Depends(get_session)
+):
+    """Leave a chat room"""
+    if not await run_in_threadpool(_leave_room, session, room_id, current_user.id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not a participant of this chat room")
+    from websocket import manager
+    await manager.invalidate_room(room_id)
+    return {"message": "Left chat room"}
+
+
+NOTIFICATION_FEED_ORDER = [(UserNotification.created_at, True), (UserNotification.id, True)]
+
+
+@router.get("/notifications", response_model=dict)
 def get_notifications(
     unread_only: bool = False,
-    limit: int = 50,
-    offset: int = 0,
+    include_archived: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     current_user: Annotated[User, Depends(get_current_active_user)] = None,
     session: Session = Depends(get_session)
 ):
-    """Get notifications for the current user"""
-    query = select(UserNotification).where(UserNotification.user_id == current_user.id)
+    """
+    Get notifications for the current user, newest first.
+
+    One query per page: the sender comes from the notification itself, or
+    from its chat for notifications stored before it was copied there. Pass
+    the returned `next_cursor` back as `cursor` for the next page.
+    """
+    query = (
+        select(
+            UserNotification.id,
+            UserNotification.title,
+            UserNotification.message,
+            UserNotification.notification_type,
+            UserNotification.is_read,
+            UserNotification.is_archived,
+            UserNotification.related_chat_id,
+            func.coalesce(UserNotification.sender_id, Chat.sender_id).label("sender_id"),
+            UserNotification.created_at,
+        )
+        .outerjoin(Chat, Chat.id == UserNotification.related_chat_id)
+        .where(UserNotification.user_id == current_user.id)
+    )
     
     if unread_only:
         query = query.where(UserNotification.is_read == False)
+    if not include_archived:
+        query = query.where(UserNotification.is_archived == False)
+    if cursor:
+        query = query.where(keyset_condition(NOTIFICATION_FEED_ORDER, decode_cursor(cursor, NOTIFICATION_FEED_ORDER)))
     
-    query = query.order_by(UserNotification.created_at.desc()).limit(limit).offset(offset)
-    notifications = session.exec(query).all()
-    
-    result = []
-    for notif in notifications:
-        sender_id = None
-        if notif.related_chat_id:
-            # Get sender_id from the related chat
-            chat = session.get(Chat, notif.related_chat_id)
-            if chat:
-                sender_id = chat.sender_id
-        
-        result.append({
-            "id": notif.id,
-            "title": notif.title,
-            "message": notif.message,
-            "notification_type": notif.notification_type,
-            "is_read": notif.is_read,
-            "related_chat_id": notif.related_chat_id,
-            "sender_id": sender_id,
-            "created_at": notif.created_at.isoformat() if notif.created_at else None,
-        })
-    
-    return result
+    rows = session.exec(query.order_by(*order_by_clause(NOTIFICATION_FEED_ORDER)).limit(limit + 1)).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].created_at, rows[-1].id])
+    
+    return {
+        "message": "Notifications fetched successfully",
+        "data": [dict(row._mapping) for row in rows],
+        "next_cursor": next_cursor,
+    }
 
 
 @router.get("/notifications/unread-count", response_model=dict)
 def get_unread_count(
-    current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    session: Session = Depends(get_session)
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
 ):
-    """Get count of unread notifications"""
-    count = session.exec(
-        select(UserNotification).where(
-            UserNotification.user_id == current_user.id,
-            UserNotification.is_read == False
-        )
-    ).all()
-    
-    return {"unread_count": len(count)}
+    """
+    Get count of unread notifications, in total and per conversation.
 
+    Connected clients also receive these as `unread_counts` messages
+    whenever they change.
+    """
+    return unread_payload(unread_counters.get(current_user.id))
 
-@router.put("/notifications/{notification_id}/read", response_model=dict)
-def mark_notification_read(
-    notification_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    session: Session = Depends(get_session)
-):
-    """Mark a notification as read"""
+
+def _mark_read(session: Session, notification_id: int, user_id: int) -> tuple[UserNotification, bool]:
+    """Mark the notification read; also returns whether it was unread"""
     notification = session.get(UserNotification, notification_id)
     
     if not notification:
@@ -166,17 +272,38 @@ def mark_notification_read(
             detail="Notification not found"
         )
     
-    if notification.user_id != current_user.id:
+    if notification.user_id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to mark this notification as read"
         )
     
+    deltas = {}
+    if not notification.is_read and not notification.is_archived:
+        chat = session.get(Chat, notification.related_chat_id) if notification.related_chat_id else None
+        deltas = notification_deltas(user_id, chat.conversation_key if chat else None, sign=-1)
+        apply_unread_deltas(session, deltas)
     notification.is_read = True
     notification.read_at = datetime.now()
     session.add(notification)
     session.commit()
     session.refresh(notification)
+    unread_counters.apply(deltas)
+    return notification, bool(deltas)
+
+
+@router.put("/notifications/{notification_id}/read", response_model=dict)
+async def mark_notification_read(
+    notification_id: int,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None,
+    session: Session = Depends(get_session)
+):
+    """Mark a notification as read"""
+    notification, was_unread = await run_in_threadpool(_mark_read, session, notification_id, current_user.id)
+    
+    if was_unread:
+        from websocket import manager
+        await manager.unread_changed([current_user.id])
     
     return {
         "id": notification.id,
@@ -186,26 +313,63 @@ def mark_notification_read(
 
 
 @router.put("/notifications/read-all", response_model=dict)
-def mark_all_notifications_read(
-    current_user: Annotated[User, Depends(get_current_active_user)] = None,
-    session: Session = Depends(get_session)
+async def mark_all_notifications_read(
+    up_to_id: Optional[int] = None,
+    before: Optional[datetime] = None,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
 ):
-    """Mark all notifications as read for the current user"""
-    notifications = session.exec(
-        select(UserNotification).where(
-            UserNotification.user_id == current_user.id,
-            UserNotification.is_read == False
+    """
+    Mark all notifications as read for the current user.
+
+    With `up_to_id` or `before`, only those up to that id or creation time.
+    """
+    count = await run_in_threadpool(notification_bulk.mark_read, current_user.id, up_to_id, before)
+    return await _bulk_result(current_user.id, count, f"Marked {count} notifications as read")
+
+
+@router.put("/notifications/read-conversation", response_model=dict)
+async def mark_conversation_notifications_read(
+    receiver_id: Optional[int] = None,
+    chat_room_id: Optional[int] = None,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
+):
+    """Mark the notifications of the conversation with `receiver_id` or of room `chat_room_id` as read"""
+    key = conversation_key(current_user.id, receiver_id, chat_room_id)
+    if not key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="receiver_id or chat_room_id is required"
         )
-    ).all()
-    
-    for notification in notifications:
-        notification.is_read = True
-        notification.read_at = datetime.now()
-        session.add(notification)
-    
-    session.commit()
-    
-    return {"message": f"Marked {len(notifications)} notifications as read"}
+    count = await run_in_threadpool(notification_bulk.mark_read, current_user.id, conversation_key=key)
+    return await _bulk_result(current_user.id, count, f"Marked {count} notifications as read")
+
+
+@router.put("/notifications/archive", response_model=dict)
+async def archive_notifications(
+    older_than: datetime,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
+):
+    """Archive the current user's notifications created before `older_than`"""
+    count = await run_in_threadpool(notification_bulk.archive_older_than, current_user.id, older_than)
+    return await _bulk_result(current_user.id, count, f"Archived {count} notifications")
+
+
+@router.delete("/notifications", response_model=dict)
+async def delete_notifications(
+    older_than: datetime,
+    only_read: bool = False,
+    current_user: Annotated[User, Depends(get_current_active_user)] = None
+):
+    """Delete the current user's notifications created before `older_than` (only read ones with `only_read`)"""
+    count = await run_in_threadpool(notification_bulk.delete_older_than, current_user.id, older_than, only_read)
+    return await _bulk_result(current_user.id, count, f"Deleted {count} notifications")
+
+
+async def _bulk_result(user_id: int, count: int, message: str) -> dict:
+    if count:
+        from websocket import manager
+        await manager.unread_changed([user_id])
+    return {"message": message, "affected": count}
 
 
 @router.get("/users/online", response_model=List[dict])
@@ -216,7 +380,7 @@ def get_online_users(
     """Get list of online users"""
     from websocket import manager
     
-    online_user_ids = list(manager.active_connections.keys())
+    online_user_ids = list(manager.online_user_ids())
     
     if not online_user_ids:
         return []
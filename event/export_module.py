@@ -0,0 +1,135 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+from models.orders import Order, OrderStatus
+from models.products import Product
+from models.users import User, UserRole
+from auth.dependencies import require_role
+from datetime import datetime
+from enum import Enum
+from typing import Iterator, Optional
+import database
+import csv
+import io
+import json
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["exports"],
+    dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))]
+)
+
+EXPORT_BATCH_SIZE = 1000
+
+ORDER_COLUMNS = [Order.id, Order.user_id, Order.product_id, Order.quantity, Order.total_amount,
+                 Order.status, Order.created_at, Order.updated_at]
+PRODUCT_COLUMNS = [Product.id, Product.sku, Product.name, Product.description, Product.price, Product.quantity,
+                   Product.is_active, Product.category_id, Product.provider_id, Product.user_id,
+                   Product.created_at, Product.updated_at]
+# Never export password hashes
+USER_COLUMNS = [User.id, User.name, User.email, User.role, User.is_active, User.is_online, User.last_seen,
+                User.created_at, User.updated_at]
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def stream_export(statement, columns, format: ExportFormat) -> Iterator[str]:
+    """
+    Yield an export one batch of rows at a time.
+
+    The query runs on its own session with yield_per, which uses a
+    server-side cursor on MySQL, so memory stays constant however many
+    rows are exported.
+    """
+    names = [column.name for column in columns]
+    with Session(database.engine) as session:
+        result = session.exec(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if format == ExportFormat.csv:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            yield buffer.getvalue()
+        for batch in result.partitions():
+            buffer = io.StringIO()
+            if format == ExportFormat.csv:
+                writer = csv.writer(buffer)
+                writer.writerows([_plain(value) for value in row] for row in batch)
+            else:
+                for row in batch:
+                    buffer.write(json.dumps(dict(zip(names, map(_plain, row))), separators=(",", ":")))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
+
+def export_response(name: str, statement, columns, format: ExportFormat) -> StreamingResponse:
+    media_type = "text/csv" if format == ExportFormat.csv else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(statement, columns, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format.value}"'}
+    )
+
+
+@router.get("/orders")
+def export_orders(
+    format: ExportFormat = ExportFormat.csv,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order_status: Optional[OrderStatus] = Query(None, alias="status")
+):
+    """Stream orders as CSV or NDJSON, optionally limited to a created_at range and a status"""
+    statement = select(*ORDER_COLUMNS)
+    if start is not None:
+        statement = statement.where(Order.created_at >= start)
+    if end is not None:
+        statement = statement.where(Order.created_at < end)
+    if order_status is not None:
+        statement = statement.where(Order.status == order_status)
+    return export_response("orders", statement.order_by(Order.id), ORDER_COLUMNS, format)
+
+
+@router.get("/products")
+def export_products(
+    format: ExportFormat = ExportFormat.csv,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    is_active: Optional[bool] = None
+):
+    """Stream products as CSV or NDJSON"""
+    statement = select(*PRODUCT_COLUMNS)
+    if start is not None:
+        statement = statement.where(Product.created_at >= start)
+    if end is not None:
+        statement = statement.where(Product.created_at < end)
+    if is_active is not None:
+        statement = statement.where(Product.is_active == is_active)
+    return export_response("products", statement.order_by(Product.id), PRODUCT_COLUMNS, format)
+
+
+@router.get("/users")
+def export_users(
+    format: ExportFormat = ExportFormat.csv,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    is_active: Optional[bool] = None
+):
+    """Stream users (without password hashes) as CSV or NDJSON"""
+    statement = select(*USER_COLUMNS)
+    if start is not None:
+        statement = statement.where(User.created_at >= start)
+    if end is not None:
+        statement = statement.where(User.created_at < end)
+    if is_active is not None:
+        statement = statement.where(User.is_active == is_active)
+    return export_response("users", statement.order_by(User.id), USER_COLUMNS, format)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File,
 from sqlmodel import Session, select
 from models.images import Image, ImageCreate, ImageUpdate, ImageResponse, ImageListResponse
 from database import get_session
+from catalog_cache import catalog_cache
 from auth.dependencies import require_role, oauth2_scheme
 from models.users import UserRole, User
 from typing import Annotated, Optional
@@ -92,6 +93,7 @@ async def create_image(
     session.add(new_image)
     session.commit()
     session.refresh(new_image)
+    catalog_cache.bump("images")
     
     return ImageResponse(
         message="Image uploaded successfully",
@@ -133,6 +135,7 @@ async def update_image(
     session.add(image)
     session.commit()
     session.refresh(image)
+    catalog_cache.bump("images")
     
     return ImageResponse(
         message="Image updated successfully",
@@ -155,4 +158,5 @@ def delete_image(
     
     session.delete(image)
     session.commit()
+    catalog_cache.bump("images")
     return None
\ No newline at end of file
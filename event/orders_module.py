@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy import case, func, insert, literal, update
 from sqlmodel import Session, select
 from models.orders import *
-from database import get_session
+from database import get_session, insert_returning_ids
+from catalog_cache import catalog_cache
+from idempotency import idempotency
+from order_rollups import apply_rollup_deltas, order_delta, order_deltas
+from inventory import holds_stock, release_stock_bulk, reserve_stock, reserve_stock_bulk
+from models.products import Product
+from promotions import promotion_index
 from auth.dependencies import require_role, oauth2_scheme
 from models.users import UserRole
 from typing import Annotated
@@ -20,34 +27,241 @@ def get_orders(session: Session = Depends(get_session)):
         OrderResponse(**order.model_dump()) for order in orders
     ]   
 
-@router.get("/get-order/{order_id}", response_model=OrderResponse)
+@router.get("/get-order/{order_id}", response_model=OrderDetailResponse)
 def get_order(order_id: int, session: Session = Depends(get_session)):
     order = session.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-    return OrderResponse(**order.model_dump())
+    return _order_detail(order, _item_responses(_order_items(session, order_id)))
+
+def _order_items(session: Session, order_id: int) -> list[OrderItem]:
+    return session.exec(select(OrderItem).where(OrderItem.order_id == order_id).order_by(OrderItem.id)).all()
+
+def _item_responses(items: list[OrderItem]) -> list[OrderItemResponse]:
+    return [OrderItemResponse(**item.model_dump()) for item in items]
+
+def _order_detail(order: Order, items: list[OrderItemResponse]) -> OrderDetailResponse:
+    return OrderDetailResponse(**order.model_dump(), items=items)
+
+def _order_demand(order: Order, items: list[OrderItem]) -> dict[int, int]:
+    """Units per product an order holds while it isn't void"""
+    if not order.stock_reserved or not holds_stock(order.status):
+        return {}
+    if not items:
+        return {order.product_id: order.quantity}
+    return {item.product_id: item.quantity for item in items}
+
+def _raise_stock_error(session: Session, demand: dict[int, int]) -> None:
+    """Explain a failed reservation: a missing product is a 404, a short one a 409"""
+    available = dict(session.exec(select(Product.id, Product.quantity).where(Product.id.in_(demand))).all())
+    missing = [product_id for product_id in demand if product_id not in available]
+    if missing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with id {missing[0]} not found")
+    short = [
+        product_id for product_id, units in demand.items()
+        if available[product_id] is not None and available[product_id] < units
+    ] or list(demand)
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Insufficient stock for product {', '.join(map(str, short))}"
+    )
 
 @router.post("/create-order", response_model=OrderResponse)
-def create_order(order: OrderCreate, session: Session = Depends(get_session)):
+def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    session: Session = Depends(get_session)
+):
+    """
+    Create an order and reserve its stock.
+
+    Send an `Idempotency-Key` header to make retries safe: a repeat with the
+    same key and body gets the original response back instead of a second order.
+    """
+    return idempotency.response("orders:create", idempotency_key, order, lambda: _create_order(session, order))
+
+def _create_order(session: Session, order: OrderCreate) -> OrderResponse:
+    # Reserve first: the conditional UPDATE is what prevents overselling
+    if holds_stock(order.status) and not reserve_stock(session, order.product_id, order.quantity):
+        session.rollback()
+        _raise_stock_error(session, {order.product_id: order.quantity})
     new_order = Order(**order.model_dump())
     session.add(new_order)
+    apply_rollup_deltas(session, [order_delta(new_order)])
     session.commit()
     session.refresh(new_order)
+    # Stock levels changed along with the orders
+    catalog_cache.bump("orders", "products")
     return OrderResponse(**new_order.model_dump())
 
+@router.post("/create-orders-batch", response_model=OrderBatchResponse)
+def create_orders_batch(batch: OrderBatchCreate, session: Session = Depends(get_session)):
+    """
+    Create up to MAX_BATCH_ORDERS orders in one transaction.
+
+    Users and products are validated with one lookup each, stock is
+    reserved with one executemany and the orders are inserted with one
+    statement. Items that reference unknown users/products or exceed the
+    remaining stock are reported as failed; the rest are created.
+    """
+    user_ids = {item.user_id for item in batch.orders}
+    product_ids = {item.product_id for item in batch.orders}
+    known_users = set(session.exec(select(User.id).where(User.id.in_(user_ids))).all())
+    # Lock the product rows (MySQL) so the stock read here stays valid until commit
+    stock = dict(session.exec(
+        select(Product.id, Product.quantity).where(Product.id.in_(product_ids)).with_for_update()
+    ).all())
+
+    now = datetime.now()
+    results: list[OrderBatchItemResult] = []
+    rows: list[dict] = []
+    demand: dict[int, int] = {}
+    for index, item in enumerate(batch.orders):
+        error = None
+        if item.user_id not in known_users:
+            error = f"User with id {item.user_id} not found"
+        elif item.product_id not in stock:
+            error = f"Product with id {item.product_id} not found"
+        elif holds_stock(item.status) and stock[item.product_id] is not None:
+            if stock[item.product_id] < item.quantity:
+                error = f"Insufficient stock for product {item.product_id}"
+            else:
+                stock[item.product_id] -= item.quantity
+        if error:
+            results.append(OrderBatchItemResult(index=index, success=False, error=error))
+            continue
+        if holds_stock(item.status):
+            demand[item.product_id] = demand.get(item.product_id, 0) + item.quantity
+        rows.append({**item.model_dump(), "created_at": now, "updated_at": now})
+        results.append(OrderBatchItemResult(index=index, success=True))
+
+    if not reserve_stock_bulk(session, demand):
+        # Only possible without row locks (SQLite) when another writer got in between
+        session.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Stock changed while processing the batch, please retry")
+    ids = iter(insert_returning_ids(session, Order, rows))
+    apply_rollup_deltas(session, [order_delta(Order(**row)) for row in rows])
+    session.commit()
+    for result in results:
+        if result.success:
+            result.id = next(ids)
+
+    if rows:
+        catalog_cache.bump("orders", "products")
+    return OrderBatchResponse(
+        message="Batch processed",
+        created=len(rows),
+        failed=len(results) - len(rows),
+        results=results
+    )
+
+@router.post("/checkout", response_model=OrderDetailResponse, status_code=status.HTTP_201_CREATED)
+def checkout(
+    cart: OrderCheckout,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    session: Session = Depends(get_session)
+):
+    """
+    Place a multi-product order in one transaction.
+
+    Line prices are the products' current prices with the best live
+    promotion applied, i.e. the effective_price listings show, and the
+    order total is summed in SQL, so the client never sends amounts. Stock for all lines
+    is reserved at once; if any product is missing, inactive, unpriced or
+    short on stock nothing is created. Supports `Idempotency-Key`.
+    """
+    return idempotency.response(
+        "orders:checkout", idempotency_key, cart, lambda: _checkout(session, cart),
+        status_code=status.HTTP_201_CREATED
+    )
+
+def _checkout(session: Session, cart: OrderCheckout) -> OrderDetailResponse:
+    demand: dict[int, int] = {}
+    for item in cart.items:
+        demand[item.product_id] = demand.get(item.product_id, 0) + item.quantity
+    if not session.get(User, cart.user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {cart.user_id} not found")
+    if holds_stock(cart.status) and not reserve_stock_bulk(session, demand):
+        session.rollback()
+        _raise_stock_error(session, demand)
+
+    new_order = Order(user_id=cart.user_id, status=cart.status, quantity=sum(demand.values()))
+    session.add(new_order)
+    session.flush()
+
+    # Charge the promotional price the catalog shows, where a promotion applies
+    catalog = session.exec(
+        select(Product.id, Product.category_id, Product.provider_id, Product.price).where(Product.id.in_(demand))
+    ).all()
+    promoted = {product_id: price for product_id, (price, _) in promotion_index.best_prices(session, catalog).items()}
+    unit_price = case(promoted, value=Product.id, else_=Product.price) if promoted else Product.price
+
+    # Price every line from the products table in one INSERT ... SELECT
+    units = case(demand, value=Product.id)
+    lines = (
+        select(literal(new_order.id), Product.id, units, unit_price, unit_price * units)
+        .where(Product.id.in_(demand), Product.price.is_not(None), Product.is_active)
+    )
+    inserted = session.exec(
+        insert(OrderItem.__table__).from_select(["order_id", "product_id", "quantity", "unit_price", "amount"], lines)
+    ).rowcount
+    if inserted != len(demand):
+        session.rollback()
+        unavailable = set(demand) - set(session.exec(
+            select(Product.id).where(Product.id.in_(demand), Product.price.is_not(None), Product.is_active)
+        ).all())
+        known = set(session.exec(select(Product.id).where(Product.id.in_(unavailable))).all())
+        if unavailable - known:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Product with id {min(unavailable - known)} not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Product {', '.join(map(str, sorted(unavailable)))} is not available for sale")
+
+    total = select(func.sum(OrderItem.amount)).where(OrderItem.order_id == new_order.id).scalar_subquery()
+    session.exec(update(Order.__table__).where(Order.__table__.c.id == new_order.id).values(total_amount=total))
+    items = _order_items(session, new_order.id)
+    apply_rollup_deltas(session, order_deltas(new_order, items))
+    lines = _item_responses(items)
+    session.commit()
+    session.refresh(new_order)
+    catalog_cache.bump("orders", "products")
+    return _order_detail(new_order, lines)
+
 @router.put("/update-order/{order_id}", response_model=OrderResponse)
 def update_order(order_id: int, order: OrderUpdate, session: Session = Depends(get_session)):
     db_order = session.get(Order, order_id)
     if not db_order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     order_data = order.model_dump(exclude_unset=True)
+    items = _order_items(session, order_id) if db_order.product_id is None else []
+    if items and order_data.keys() & {"product_id", "quantity", "total_amount"}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Lines and totals of a checkout order can't be changed")
+    # Every field is optional to send, but none can be cleared
+    cleared = sorted(key for key, value in order_data.items() if value is None)
+    if cleared:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"{', '.join(cleared)} can't be null")
+    reserved = _order_demand(db_order, items)
+    previous = order_deltas(db_order, items, sign=-1)
     for key, value in order_data.items():
         setattr(db_order, key, value)
 
+    # Moving to cancelled/refunded/failed releases the units, moving back out
+    # of it (or changing product/quantity) reserves them again
+    wanted = _order_demand(db_order, items)
+    if wanted != reserved:
+        release_stock_bulk(session, reserved)
+        if not reserve_stock_bulk(session, wanted):
+            session.rollback()
+            _raise_stock_error(session, wanted)
+
     db_order.updated_at = datetime.now()
     session.add(db_order)
+    apply_rollup_deltas(session, previous + order_deltas(db_order, items))
     session.commit()
     session.refresh(db_order)
+    catalog_cache.bump("orders", "products")
     return OrderResponse(**db_order.model_dump())
 
 @router.delete("/delete-order/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -55,6 +269,11 @@ def delete_order(order_id: int, session: Session = Depends(get_session)):
     db_order = session.get(Order, order_id)
     if not db_order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    items = _order_items(session, order_id) if db_order.product_id is None else []
+    release_stock_bulk(session, _order_demand(db_order, items))
+    apply_rollup_deltas(session, order_deltas(db_order, items, sign=-1))
+    # Order items go with the order through the relationship cascade
     session.delete(db_order)
     session.commit()
+    catalog_cache.bump("orders", "products")
     return None
\ No newline at end of file
@@ -1,7 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import or_
 from sqlmodel import Session, select
 from models.products import *
 from database import get_session
+from aggregates import product_order_stats
+from catalog_cache import catalog_cache
+from idempotency import idempotency
+from models.orders import OrderItem, OrderListResponse, OrderResponse, OrderStatus
+from product_bulk import FeedFormat, iter_body_lines, run_bulk_upsert
+from pagination import decode_cursor, encode_cursor, keyset_condition, order_by_clause
+from promotions import apply_promotions
+from product_search import apply_product_filter, product_index, search_products as run_product_search
 from auth.dependencies import require_role, oauth2_scheme
 from models.users import UserRole
 from typing import Annotated
@@ -13,20 +23,197 @@ router = APIRouter(
     tags=["products"]   
 )
 
-@router.get("/get-products", response_model=list[ProductResponse])
-def get_products(session: Session = Depends(get_session)):
-    products = session.exec(select(Product)).all()
-    return [
-        ProductResponse(**product.model_dump()) for product in products
+def _attach_order_stats(session: Session, products: list[ProductResponse]) -> None:
+    stats = product_order_stats(session, [product.id for product in products])
+    for product in products:
+        product.order_stats = stats[product.id]
+
+PRODUCT_SORTS = {
+    ProductSort.newest: [(Product.id, True)],
+    ProductSort.oldest: [(Product.id, False)],
+    ProductSort.price_asc: [(Product.price, False), (Product.id, False)],
+    ProductSort.price_desc: [(Product.price, True), (Product.id, True)],
+    ProductSort.name_asc: [(Product.name, False), (Product.id, False)],
+    ProductSort.name_desc: [(Product.name, True), (Product.id, True)],
+}
+
+@router.get("/get-products", response_model=ProductListResponse)
+def get_products(
+    filters: ProductFilter = Depends(),
+    sort: ProductSort = ProductSort.newest,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    include_stats: bool = False,
+    session: Session = Depends(get_session)
+):
+    """
+    List products one page at a time.
+
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
+    Price sorts only include products that have a price. With
+    `include_stats`, each product carries its order aggregates.
+    """
+    tables = ("products", "promotions", "orders") if include_stats else ("products", "promotions")
+    params = {**filters.model_dump(), "sort": sort.value, "cursor": cursor, "limit": limit, "include_stats": include_stats}
+    return catalog_cache.response(
+        "products", tables, params,
+        lambda: _list_products(session, filters, sort, cursor, limit, include_stats)
+    )
+
+def _list_products(session: Session, filters: ProductFilter, sort: ProductSort, cursor: Optional[str],
+                   limit: int, include_stats: bool) -> ProductListResponse:
+    order = PRODUCT_SORTS[sort]
+    statement = apply_product_filter(select(*Product.__table__.columns), filters)
+    if sort in (ProductSort.price_asc, ProductSort.price_desc):
+        statement = statement.where(Product.price.is_not(None))
+    if cursor:
+        statement = statement.where(keyset_condition(order, decode_cursor(cursor, order)))
+    statement = statement.order_by(*order_by_clause(order)).limit(limit + 1)
+    rows = session.exec(statement).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor([last[column.name] for column, _ in order])
+    products = [ProductResponse.model_validate(dict(row._mapping)) for row in rows]
+    apply_promotions(session, products)
+    if include_stats:
+        _attach_order_stats(session, products)
+    return ProductListResponse(
+        message="Products fetched successfully",
+        data=products,
+        next_cursor=next_cursor
+    )
+
+@router.get("/search", response_model=list[ProductSearchResponse])
+def search_products(
+    q: str = Query(..., min_length=1),
+    filters: ProductFilter = Depends(),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    include_stats: bool = False,
+    session: Session = Depends(get_session)
+):
+    """Full-text search over product name and description, best matches first"""
+    results = run_product_search(session, q, filters, limit=limit, offset=offset)
+    products = [
+        ProductSearchResponse(**product.model_dump(), score=score) for product, score in results
     ]
+    apply_promotions(session, products)
+    if include_stats:
+        _attach_order_stats(session, products)
+    return products
 
 @router.get("/get-product/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, session: Session = Depends(get_session)):
+def get_product(product_id: int, include_stats: bool = False, session: Session = Depends(get_session)):
     product = session.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with id {product_id} not found")
-    return ProductResponse(**product.model_dump())
+    response = ProductResponse(**product.model_dump())
+    apply_promotions(session, [response])
+    if include_stats:
+        _attach_order_stats(session, [response])
+    return response
+
+@router.get("/get-product/{product_id}/orders", response_model=OrderListResponse)
+def get_product_orders(
+    product_id: int,
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    session: Session = Depends(get_session)
+):
+    """Orders of one product (including checkout orders with a line for it), newest first"""
+    if not session.get(Product, product_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with id {product_id} not found")
+    order = [(Order.id, True)]
+    checkout_orders = select(OrderItem.order_id).where(OrderItem.product_id == product_id)
+    statement = select(*Order.__table__.columns).where(
+        or_(Order.product_id == product_id, Order.id.in_(checkout_orders))
+    )
+    if order_status is not None:
+        statement = statement.where(Order.status == order_status)
+    if cursor:
+        statement = statement.where(keyset_condition(order, decode_cursor(cursor, order)))
+    rows = session.exec(statement.order_by(*order_by_clause(order)).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].id])
+    return OrderListResponse(
+        message="Orders fetched successfully",
+        data=[OrderResponse.model_validate(dict(row._mapping)) for row in rows],
+        next_cursor=next_cursor
+    )
 
 @router.post("/create-product", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
-def create_product(product: ProductCreate, session: Session = Depends(get_session)):
-    new_product = Product(**product.model_dump())
\ No newline at end of file
+def create_product(
+    product: ProductCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    session: Session = Depends(get_session)
+):
+    """Create a product; a repeat with the same `Idempotency-Key` replays the original response"""
+    return idempotency.response(
+        "products:create", idempotency_key, product, lambda: _create_product(session, product),
+        status_code=status.HTTP_201_CREATED
+    )
+
+def _create_product(session: Session, product: ProductCreate) -> ProductResponse:
+    new_product = Product(**product.model_dump())
+    session.add(new_product)
+    session.commit()
+    session.refresh(new_product)
+    product_index.add(new_product)
+    catalog_cache.bump("products")
+    return ProductResponse(**new_product.model_dump())
+
+@router.post("/bulk-upsert", response_model=BulkUpsertResult,
+             dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))])
+async def bulk_upsert_products(request: Request, format: Optional[FeedFormat] = None):
+    """
+    Create or update products from an NDJSON or CSV feed keyed by `sku`.
+
+    The body is streamed and written in batched transactions; rows that
+    fail validation or are rejected by the database are reported by line
+    number without stopping the import. Fields a row leaves out (or an
+    empty CSV cell) keep an existing product's stored value. The format
+    defaults to CSV for a text/csv Content-Type and NDJSON otherwise.
+    """
+    if format is None:
+        is_csv = "csv" in request.headers.get("content-type", "")
+        format = FeedFormat.csv if is_csv else FeedFormat.ndjson
+    stream = request.stream()
+    result = await run_in_threadpool(run_bulk_upsert, iter_body_lines(stream), format)
+    if result.created or result.updated:
+        catalog_cache.bump("products")
+    return result
+
+@router.put("/update-product/{product_id}", response_model=ProductResponse)
+def update_product(product_id: int, product: ProductUpdate, session: Session = Depends(get_session)):
+    db_product = session.get(Product, product_id)
+    if not db_product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with id {product_id} not found")
+    product_data = product.model_dump(exclude_unset=True)
+    for key, value in product_data.items():
+        setattr(db_product, key, value)
+
+    db_product.updated_at = datetime.utcnow()
+    session.add(db_product)
+    session.commit()
+    session.refresh(db_product)
+    product_index.add(db_product)
+    catalog_cache.bump("products")
+    return ProductResponse(**db_product.model_dump())
+
+@router.delete("/delete-product/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_product(product_id: int, session: Session = Depends(get_session)):
+    db_product = session.get(Product, product_id)
+    if not db_product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with id {product_id} not found")
+    session.delete(db_product)
+    session.commit()
+    product_index.remove(product_id)
+    catalog_cache.bump("products")
+    return None
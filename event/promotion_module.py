@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import ValidationError
+from sqlmodel import Session, select
+from models.promotion import *
+from models.products import Product
+from models.categories import Category
+from models.providers import Provider
+from database import get_session
+from catalog_cache import catalog_cache
+from promotions import promotion_index
+from auth.dependencies import require_role
+from models.users import UserRole
+
+router = APIRouter(
+    prefix="/promotions",
+    tags=["promotions"]
+)
+
+SCOPE_MODELS = {
+    PromotionScope.product: Product,
+    PromotionScope.category: Category,
+    PromotionScope.provider: Provider,
+}
+
+def _check_target(session: Session, scope: PromotionScope, target_id: int) -> None:
+    if not session.get(SCOPE_MODELS[scope], target_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{scope.value.capitalize()} with id {target_id} not found")
+
+def _changed(promotion: Promotion) -> None:
+    promotion_index.put(promotion)
+    catalog_cache.bump("promotions")
+
+@router.get("/get-promotions", response_model=list[PromotionResponse])
+def get_promotions(
+    scope: Optional[PromotionScope] = None,
+    target_id: Optional[int] = None,
+    active_only: bool = False,
+    session: Session = Depends(get_session)
+):
+    statement = select(Promotion)
+    if scope is not None:
+        statement = statement.where(Promotion.scope == scope)
+    if target_id is not None:
+        statement = statement.where(Promotion.target_id == target_id)
+    if active_only:
+        statement = statement.where(Promotion.is_active)
+    promotions = session.exec(statement.order_by(Promotion.id)).all()
+    return [PromotionResponse(**promotion.model_dump()) for promotion in promotions]
+
+@router.get("/get-promotion/{promotion_id}", response_model=PromotionResponse)
+def get_promotion(promotion_id: int, session: Session = Depends(get_session)):
+    promotion = session.get(Promotion, promotion_id)
+    if not promotion:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Promotion with id {promotion_id} not found")
+    return PromotionResponse(**promotion.model_dump())
+
+@router.post("/create-promotion",
+dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
+response_model=PromotionResponse, status_code=status.HTTP_201_CREATED)
+def create_promotion(promotion: PromotionCreate, session: Session = Depends(get_session)):
+    _check_target(session, promotion.scope, promotion.target_id)
+    new_promotion = Promotion(**promotion.model_dump())
+    session.add(new_promotion)
+    session.commit()
+    session.refresh(new_promotion)
+    _changed(new_promotion)
+    return PromotionResponse(**new_promotion.model_dump())
+
+@router.put("/update-promotion/{promotion_id}",
+dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
+response_model=PromotionResponse)
+def update_promotion(promotion_id: int, promotion: PromotionUpdate, session: Session = Depends(get_session)):
+    db_promotion = session.get(Promotion, promotion_id)
+    if not db_promotion:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Promotion with id {promotion_id} not found")
+    for key, value in promotion.model_dump(exclude_unset=True).items():
+        setattr(db_promotion, key, value)
+    # Re-check the combined rules, the update may only carry some of the fields
+    try:
+        PromotionCreate.model_validate(db_promotion.model_dump())
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False, include_context=False, include_input=False))
+    _check_target(session, db_promotion.scope, db_promotion.target_id)
+    db_promotion.updated_at = datetime.utcnow()
+    session.add(db_promotion)
+    session.commit()
+    session.refresh(db_promotion)
+    _changed(db_promotion)
+    return PromotionResponse(**db_promotion.model_dump())
+
+@router.delete("/delete-promotion/{promotion_id}",
+dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
+status_code=status.HTTP_204_NO_CONTENT)
+def delete_promotion(promotion_id: int, session: Session = Depends(get_session)):
+    promotion = session.get(Promotion, promotion_id)
+    if not promotion:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Promotion with id {promotion_id} not found")
+    session.delete(promotion)
+    session.commit()
+    promotion_index.remove(promotion_id)
+    catalog_cache.bump("promotions")
+    return None
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select
 from models.providers import *
 from database import get_session
+from aggregates import provider_product_stats, provider_products
+from catalog_cache import catalog_cache
+from pagination import decode_cursor, encode_cursor, keyset_condition, order_by_clause
+from provider_feeds import FeedSyncBusy, FeedSyncError, feed_scheduler
 from auth.dependencies import require_role
 from models.users import UserRole
 
@@ -11,19 +15,66 @@ router = APIRouter(
 
 )
 
-@router.get("/get-providers", response_model=list[ProviderResponse])
-def get_providers(session: Session = Depends(get_session)):
-    providers = session.exec(select(Provider)).all()
-    return [
-        ProviderResponse(**provider.model_dump()) for provider in providers
-    ]
+MAX_EMBEDDED_PRODUCTS = 50
+
+def _with_products(session: Session, providers: list[ProviderResponse], products_per_provider: int) -> list[ProviderResponse]:
+    """Fill in product aggregates (and optionally the newest products) with one query each for the whole page"""
+    provider_ids = [provider.id for provider in providers]
+    stats = provider_product_stats(session, provider_ids)
+    products = provider_products(session, provider_ids, products_per_provider)
+    for provider in providers:
+        provider.product_stats = stats[provider.id]
+        provider.products = products[provider.id]
+    return providers
+
+@router.get("/get-providers", response_model=ProviderListResponse)
+def get_providers(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    products_per_provider: int = Query(0, ge=0, le=MAX_EMBEDDED_PRODUCTS),
+    session: Session = Depends(get_session)
+):
+    """
+    List providers with their product count, active product count and
+    units in stock, one page at a time.
+
+    Set `products_per_provider` to also embed each provider's newest
+    products. Pass the returned `next_cursor` back as `cursor` for the next page.
+    """
+    params = {"cursor": cursor, "limit": limit, "products_per_provider": products_per_provider}
+    return catalog_cache.response(
+        "providers", ("providers", "products"), params,
+        lambda: _list_providers(session, cursor, limit, products_per_provider)
+    )
+
+def _list_providers(session: Session, cursor: Optional[str], limit: int, products_per_provider: int) -> ProviderListResponse:
+    order = [(Provider.id, False)]
+    statement = select(Provider)
+    if cursor:
+        statement = statement.where(keyset_condition(order, decode_cursor(cursor, order)))
+    providers = session.exec(statement.order_by(*order_by_clause(order)).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(providers) > limit:
+        providers = providers[:limit]
+        next_cursor = encode_cursor([providers[-1].id])
+    data = [ProviderResponse(**provider.model_dump()) for provider in providers]
+    return ProviderListResponse(
+        message="Providers fetched successfully",
+        data=_with_products(session, data, products_per_provider),
+        next_cursor=next_cursor
+    )
 
 @router.get("/get-provider/{provider_id}", response_model=ProviderResponse)
-def get_provider(provider_id: int, session: Session = Depends(get_session)):
+def get_provider(
+    provider_id: int,
+    products_per_provider: int = Query(0, ge=0, le=MAX_EMBEDDED_PRODUCTS),
+    session: Session = Depends(get_session)
+):
     provider = session.get(Provider, provider_id)   
     if not provider:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Provider with id {provider_id} not found")
-    return ProviderResponse(**provider.model_dump())
+    return _with_products(session, [ProviderResponse(**provider.model_dump())], products_per_provider)[0]
 
 @router.post("/create-provider", 
 dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
@@ -34,6 +85,7 @@ def create_provider(provider: ProviderCreate, session: Session = Depends(get_ses
     session.add(new_provider)
     session.commit()
     session.refresh(new_provider)
+    catalog_cache.bump("providers")
     return ProviderResponse(**new_provider.model_dump())
 
 @router.put("/update-provider/{provider_id}", 
@@ -41,14 +93,33 @@ dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
     response_model=ProviderResponse)
 
 def update_provider(provider_id: int, provider: ProviderUpdate, session: Session = Depends(get_session)):
-    provider = session.get(Provider, provider_id)
-    if not provider:
+    db_provider = session.get(Provider, provider_id)
+    if not db_provider:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Provider with id {provider_id} not found")
-    provider.name = provider.name
-    provider.description = provider.description
+    for key, value in provider.model_dump(exclude_unset=True).items():
+        setattr(db_provider, key, value)
+    db_provider.updated_at = datetime.utcnow()
+    session.add(db_provider)
     session.commit()
-    session.refresh(provider)
-    return ProviderResponse(**provider.model_dump())
+    session.refresh(db_provider)
+    catalog_cache.bump("providers")
+    return ProviderResponse(**db_provider.model_dump())
+
+@router.post("/sync-feed/{provider_id}",
+dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
+response_model=FeedSyncResult)
+async def sync_provider_feed(provider_id: int):
+    """
+    Scrape the provider's feed page now and apply new prices, stock and
+    products. Shares the scheduler's concurrency limit.
+    """
+    try:
+        result = await feed_scheduler.sync(provider_id)
+    except FeedSyncBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except FeedSyncError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Feed sync failed: {e}")
+    return result
 
 @router.delete("/delete-provider/{provider_id}", 
 dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))],
@@ -59,4 +130,5 @@ def delete_provider(provider_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Provider with id {provider_id} not found")
     session.delete(provider)
     session.commit()
+    catalog_cache.bump("providers")
     return {"message": f"Provider with id {provider_id} deleted successfully"}
\ No newline at end of file
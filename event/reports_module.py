@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlmodel import Session, select
+from models.orders import OrderStatus
+from models.reports import OrderDailyRollup, OrderReportRow, RollupGrouping
+from database import get_session
+from auth.dependencies import require_role
+from models.users import UserRole
+from order_rollups import rebuild_rollups
+from datetime import date
+from typing import Optional
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"],
+    dependencies=[Depends(require_role(UserRole.admin, UserRole.super_admin))]
+)
+
+@router.get("/orders/daily", response_model=list[OrderReportRow])
+def get_daily_order_report(
+    start: date,
+    end: date,
+    group_by: RollupGrouping = RollupGrouping.day,
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    session: Session = Depends(get_session)
+):
+    """
+    Orders, units and revenue per day and status, read from the daily rollups only.
+
+    An order with several products counts once per row of the report, like
+    the analytics endpoint counts it once per group.
+    """
+    dimensions = [OrderDailyRollup.day, OrderDailyRollup.status]
+    orders = OrderDailyRollup.order_count
+    if group_by == RollupGrouping.product:
+        dimensions.append(OrderDailyRollup.product_id)
+        orders = OrderDailyRollup.product_order_count
+    elif group_by == RollupGrouping.category:
+        dimensions.append(OrderDailyRollup.category_id)
+        orders = OrderDailyRollup.category_order_count
+
+    statement = (
+        select(
+            *dimensions,
+            func.sum(orders).label("order_count"),
+            func.sum(OrderDailyRollup.units).label("units"),
+            func.sum(OrderDailyRollup.revenue).label("revenue")
+        )
+        .where(OrderDailyRollup.day >= start, OrderDailyRollup.day <= end)
+        .group_by(*dimensions)
+        .order_by(*dimensions)
+    )
+    if order_status is not None:
+        statement = statement.where(OrderDailyRollup.status == order_status)
+
+    rows = session.exec(statement).all()
+    return [OrderReportRow.model_validate(dict(row._mapping)) for row in rows if row.order_count]
+
+@router.post("/orders/rebuild", response_model=dict)
+def rebuild_order_rollups(since: Optional[date] = None, session: Session = Depends(get_session)):
+    """Recompute the daily rollups from the orders table, e.g. after a backfill"""
+    written = rebuild_rollups(session, since)
+    return {"message": f"Rebuilt {written} rollup rows"}
@@ -187,7 +187,7 @@ def get_chat_users(
     statement = select(User).where(User.is_active == True)
     users = session.exec(statement).all()
     
-    online_user_ids = set(manager.active_connections.keys())
+    online_user_ids = manager.online_user_ids()
     
     return [
         {
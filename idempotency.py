@@ -0,0 +1,285 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.config import Config
+
+import database
+from models.idempotency import IdempotencyRecord
+
+config = Config(".env")
+
+# How long a stored response is replayed for
+IDEMPOTENCY_TTL = config("IDEMPOTENCY_TTL", cast=float, default=24 * 3600.0)
+# "database" shares keys between workers, "local" keeps them in this process only
+IDEMPOTENCY_STORE = config("IDEMPOTENCY_STORE", default="database")
+# How long a duplicate waits for the in-flight original before giving up
+IDEMPOTENCY_WAIT = config("IDEMPOTENCY_WAIT", cast=float, default=30.0)
+# A key still pending after this long is treated as abandoned (its worker died, or
+# storing the response failed) and the next request with it runs again
+IDEMPOTENCY_LEASE = config("IDEMPOTENCY_LEASE", cast=float, default=120.0)
+IDEMPOTENCY_LOCAL_MAX_KEYS = config("IDEMPOTENCY_LOCAL_MAX_KEYS", cast=int, default=100_000)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: Optional[int] = None
+    body: Optional[bytes] = None
+
+    @property
+    def pending(self) -> bool:
+        return self.status_code is None
+
+
+class LocalIdempotencyStore:
+    """In-process store for single-worker deployments and development"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_LOCAL_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # Insertion order is expiry order since every key gets the same TTL
+        self._entries: "OrderedDict[str, tuple[StoredResponse, float]]" = OrderedDict()
+
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Reserve `key` for a new request, or return what is already stored under it"""
+        now = time.monotonic()
+        with self._lock:
+            while self._entries and (next(iter(self._entries.values()))[1] <= now or len(self._entries) >= self.max_keys):
+                self._entries.popitem(last=False)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            self._entries[key] = (StoredResponse(fingerprint), now + self.ttl)
+            return None
+
+    def complete(self, key: str, status_code: int, body: bytes) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0].status_code = status_code
+                entry[0].body = body
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Keys in the idempotency_keys table, shared by all workers.
+
+    A claim is committed before the write runs, so a worker dying in
+    between would leave the key pending. Pending claims older than `lease`
+    seconds are taken over by the next request with the same payload.
+    """
+
+    # Expired rows are deleted once every this many claims
+    PURGE_EVERY = 1000
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, lease: float = IDEMPOTENCY_LEASE):
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._claims = 0
+
+    def _take_over(self, session: Session, record: IdempotencyRecord, now: datetime) -> bool:
+        """Claim an abandoned pending key, unless another request took it over first"""
+        table = IdempotencyRecord.__table__
+        claimed = table.c.claimed_at.is_(None) if record.claimed_at is None else table.c.claimed_at == record.claimed_at
+        taken = session.exec(
+            update(table)
+            .where(table.c.key == record.key, table.c.status_code.is_(None), claimed)
+            .values(claimed_at=now, expires_at=now + timedelta(seconds=self.ttl))
+        ).rowcount == 1
+        session.commit()
+        return taken
+
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        now = datetime.utcnow()
+        with self._lock:
+            self._claims += 1
+            purge = self._claims % self.PURGE_EVERY == 0
+        with Session(database.engine) as session:
+            if purge:
+                session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= now))
+                session.commit()
+            record = session.get(IdempotencyRecord, key)
+            if record is not None and record.expires_at > now:
+                abandoned = record.status_code is None and (
+                    record.claimed_at is None or record.claimed_at <= now - timedelta(seconds=self.lease)
+                )
+                if abandoned and record.fingerprint == fingerprint:
+                    if self._take_over(session, record, now):
+                        return None
+                    session.refresh(record)
+                return StoredResponse(record.fingerprint, record.status_code, record.body)
+            if record is not None:
+                session.delete(record)
+                session.flush()
+            session.add(IdempotencyRecord(
+                key=key, fingerprint=fingerprint, claimed_at=now, expires_at=now + timedelta(seconds=self.ttl)
+            ))
+            try:
+                session.commit()
+                return None
+            except IntegrityError:
+                # Another worker claimed it between our read and insert
+                session.rollback()
+                record = session.get(IdempotencyRecord, key)
+                return StoredResponse(record.fingerprint, record.status_code, record.body)
+
+    def complete(self, key: str, status_code: int, body: bytes) -> None:
+        with Session(database.engine) as session:
+            record = session.get(IdempotencyRecord, key)
+            if record is not None:
+                record.status_code = status_code
+                record.body = body
+                session.add(record)
+                session.commit()
+
+    def release(self, key: str) -> None:
+        with Session(database.engine) as session:
+            session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.key == key))
+            session.commit()
+
+
+class _Flight:
+    """An idempotent request in progress that duplicates in this process wait on"""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response: Optional[StoredResponse] = None
+        self.error: Optional[BaseException] = None
+
+
+class IdempotencyGuard:
+    """
+    Runs a write at most once per Idempotency-Key.
+
+    Duplicates that arrive while the original is still running in this
+    process wait for it and share its outcome; later ones are answered
+    from the store without touching the endpoint. Only successful
+    responses are stored, so a failed request can be retried with the
+    same key. Reusing a key with a different payload is a 422.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Flight] = {}
+        self.replayed = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _digest(*parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    @staticmethod
+    def _mismatch() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request payload"
+        )
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise self._mismatch()
+        if stored.pending:
+            # The original is running in another worker
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed",
+                headers={"Retry-After": "1"}
+            )
+        with self._lock:
+            self.replayed += 1
+        return Response(content=stored.body, status_code=stored.status_code, media_type="application/json",
+                        headers={REPLAYED_HEADER: "true"})
+
+    def response(
+        self,
+        scope: str,
+        idempotency_key: Optional[str],
+        payload: BaseModel,
+        compute: Callable[[], Any],
+        status_code: int = status.HTTP_200_OK
+    ) -> Response:
+        """Run `compute` once for this key and return its JSON response, replaying it for repeats"""
+        if idempotency_key is None:
+            return Response(content=_encode(compute()), status_code=status_code, media_type="application/json")
+
+        key = self._digest(scope, idempotency_key)
+        fingerprint = self._digest(payload.model_dump_json())
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight(fingerprint)
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if flight.fingerprint != fingerprint:
+                raise self._mismatch()
+            if not flight.done.wait(IDEMPOTENCY_WAIT):
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is still being processed",
+                                    headers={"Retry-After": "1"})
+            if flight.error is not None:
+                raise flight.error
+            return self._replay(flight.response, fingerprint)
+
+        try:
+            stored = self.store.claim(key, fingerprint)
+            if stored is not None:
+                flight.response = stored
+                return self._replay(stored, fingerprint)
+            try:
+                body = _encode(compute())
+            except BaseException:
+                self.store.release(key)
+                raise
+            flight.response = StoredResponse(fingerprint, status_code, body)
+            self.store.complete(key, status_code, body)
+            return Response(content=body, status_code=status_code, media_type="application/json")
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "store": type(self.store).__name__,
+                "in_flight": len(self._inflight),
+                "replayed": self.replayed,
+                "coalesced": self.coalesced,
+            }
+
+
+def _encode(content: Any) -> bytes:
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+
+
+idempotency = IdempotencyGuard(
+    LocalIdempotencyStore() if IDEMPOTENCY_STORE == "local" else DatabaseIdempotencyStore()
+)
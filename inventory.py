@@ -0,0 +1,77 @@
+from typing import Dict
+
+from sqlalchemy import bindparam, or_, update
+from sqlmodel import Session
+
+from models.orders import OrderStatus, VOID_ORDER_STATUSES
+from models.products import Product
+
+_products = Product.__table__
+
+
+def holds_stock(order_status: OrderStatus) -> bool:
+    """Whether an order in this status keeps its units reserved"""
+    return order_status not in VOID_ORDER_STATUSES
+
+
+def reserve_stock(session: Session, product_id: int, quantity: int) -> bool:
+    """
+    Take `quantity` units of a product if that many are available.
+
+    A single conditional UPDATE, so concurrent reservations never oversell
+    and only hold the product row lock for the duration of the statement.
+    Returns False if the product is missing or short on stock.
+    """
+    result = session.exec(
+        update(_products)
+        .where(
+            _products.c.id == product_id,
+            # Products with a NULL quantity don't track stock and are never short
+            or_(_products.c.quantity.is_(None), _products.c.quantity >= quantity)
+        )
+        .values(quantity=_products.c.quantity - quantity)
+    )
+    return result.rowcount == 1
+
+
+def release_stock(session: Session, product_id: int, quantity: int) -> None:
+    """Put `quantity` previously reserved units back on the shelf"""
+    session.exec(
+        update(_products)
+        .where(_products.c.id == product_id, _products.c.quantity.is_not(None))
+        .values(quantity=_products.c.quantity + quantity)
+    )
+
+
+def reserve_stock_bulk(session: Session, demand: Dict[int, int]) -> bool:
+    """
+    Reserve several products at once, all or nothing.
+
+    Runs the conditional UPDATE as one executemany. Returns False if any
+    product was short; the caller must then roll back the transaction.
+    """
+    if not demand:
+        return True
+    statement = (
+        update(_products)
+        .where(
+            _products.c.id == bindparam("product_id"),
+            or_(_products.c.quantity.is_(None), _products.c.quantity >= bindparam("units"))
+        )
+        .values(quantity=_products.c.quantity - bindparam("units"))
+    )
+    params = [{"product_id": product_id, "units": units} for product_id, units in demand.items()]
+    result = session.exec(statement, params=params)
+    return result.rowcount == len(params)
+
+
+def release_stock_bulk(session: Session, demand: Dict[int, int]) -> None:
+    """Put the units of several products back with one executemany"""
+    if not demand:
+        return
+    statement = (
+        update(_products)
+        .where(_products.c.id == bindparam("product_id"), _products.c.quantity.is_not(None))
+        .values(quantity=_products.c.quantity + bindparam("units"))
+    )
+    session.exec(statement, params=[{"product_id": product_id, "units": units} for product_id, units in demand.items()])
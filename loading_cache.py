@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Set, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LoadingCache(Generic[K, V]):
+    """
+    Values loaded from the database on a miss, kept for `ttl` seconds.
+
+    Subclasses implement `_load`. A load that raced with `invalidate` isn't
+    stored: invalidating a key drops its loads in flight, which are only
+    tracked while they run. The least recently used keys are dropped
+    beyond `max_entries`. `get` blocks on a miss, so call it off the event loop.
+    """
+
+    # Names the entry count in `stats`, e.g. "rooms" -> {"rooms", "max_rooms"}
+    label = "entries"
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[K, Tuple[V, float]]" = OrderedDict()
+        self._loading: Dict[K, Set[object]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, key: K) -> Optional[V]:
+        """Read the value from the database; None means there is nothing to cache"""
+        raise NotImplementedError
+
+    def _copy(self, value: V) -> V:
+        """What callers get and what is stored; mutable values should be copied"""
+        return value
+
+    def peek(self, key: K) -> Optional[V]:
+        """The cached value, or None when the key isn't cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[0])
+
+    def get(self, key: K) -> Optional[V]:
+        value = self.peek(key)
+        if value is not None:
+            return value
+        load = object()
+        with self._lock:
+            self.misses += 1
+            self._loading.setdefault(key, set()).add(load)
+        value = None
+        try:
+            value = self._load(key)
+        finally:
+            self._finish(key, load, value)
+        return value
+
+    def _finish(self, key: K, load: object, value: Optional[V]) -> None:
+        """End a load, caching what it read unless the key was invalidated meanwhile"""
+        with self._lock:
+            loads = self._loading.get(key)
+            if loads is None or load not in loads:
+                return
+            loads.discard(load)
+            if not loads:
+                del self._loading[key]
+            if value is not None:
+                self._entries[key] = (self._copy(value), time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def _cancel_loads(self, key: K) -> None:
+        """Keep loads in flight for `key` from being stored; hold the lock"""
+        self._loading.pop(key, None)
+
+    def invalidate(self, *keys: K) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._cancel_loads(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                self.label: len(self._entries),
+                f"max_{self.label}": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -11,6 +11,10 @@ from event.product_module import router as product_module_router
 from event.providers_module import router as providers_module_router
 from event.orders_module import router as orders_module_router
 from event.scraping_module import router as scraping_module_router
+from event.analytics_module import router as analytics_module_router
+from event.reports_module import router as reports_module_router
+from event.export_module import router as export_module_router
+from event.promotion_module import router as promotion_module_router
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
@@ -29,6 +33,10 @@ router.include_router(product_module_router, tags=["products"])
 router.include_router(providers_module_router, tags=["providers"])
 router.include_router(orders_module_router, tags=["orders"])
 router.include_router(scraping_module_router, tags=["scraping"])
+router.include_router(analytics_module_router, tags=["analytics"])
+router.include_router(reports_module_router, tags=["reports"])
+router.include_router(export_module_router, tags=["exports"])
+router.include_router(promotion_module_router, tags=["promotions"])
 # Web routes router
 web_router = APIRouter()
 
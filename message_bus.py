@@ -0,0 +1,105 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from starlette.config import Config
+
+config = Config(".env")
+
+# "local" for a single worker (and tests), "redis" to connect several workers
+WS_BUS = config("WS_BUS", default="local")
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+
+BROADCAST_CHANNEL = "ws:broadcast"
+PRESENCE_CHANNEL = "ws:presence"
+
+Handler = Callable[[Dict], Awaitable[None]]
+
+
+def worker_channel(worker_id: str) -> str:
+    """Channel carrying messages for users connected to one worker"""
+    return f"ws:worker:{worker_id}"
+
+
+class LocalHub:
+    """Routes published messages to the LocalBus subscribers of one process"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, List[Handler]] = {}
+
+
+class LocalBus:
+    """
+    In-process pub/sub with the same semantics as RedisBus.
+
+    Messages go through JSON and are delivered asynchronously, so several
+    managers sharing a hub behave like workers sharing a Redis server.
+    """
+
+    def __init__(self, hub: Optional[LocalHub] = None):
+        self.hub = hub or LocalHub()
+        self._handler: Optional[Handler] = None
+        self._channels: List[str] = []
+
+    async def subscribe(self, channels: List[str], handler: Handler) -> None:
+        self._handler = handler
+        self._channels = list(channels)
+        for channel in self._channels:
+            self.hub.subscribers.setdefault(channel, []).append(handler)
+
+    async def publish(self, channel: str, message: Dict) -> None:
+        payload = json.dumps(message, default=str)
+        for handler in list(self.hub.subscribers.get(channel, [])):
+            asyncio.get_running_loop().create_task(handler(json.loads(payload)))
+
+    async def close(self) -> None:
+        for channel in self._channels:
+            handlers = self.hub.subscribers.get(channel, [])
+            if self._handler in handlers:
+                handlers.remove(self._handler)
+        self._channels = []
+
+
+class RedisBus:
+    """Redis pub/sub shared by all workers; the redis package is only needed when this bus is used"""
+
+    def __init__(self, url: str = REDIS_URL):
+        self.url = url
+        self._redis = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def subscribe(self, channels: List[str], handler: Handler) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(*channels)
+        self._reader = asyncio.create_task(self._read(handler))
+
+    async def _read(self, handler: Handler) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        await handler(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Connection dropped: redis-py reconnects on the next listen
+                await asyncio.sleep(1)
+
+    async def publish(self, channel: str, message: Dict) -> None:
+        await self._redis.publish(channel, json.dumps(message, default=str))
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+def create_bus():
+    return RedisBus() if WS_BUS == "redis" else LocalBus()
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import AddConstraint, CreateColumn, Table
+from sqlmodel import Session, SQLModel
+
+
+def _table(name: str) -> Table:
+    return SQLModel.metadata.tables[name]
+
+
+@dataclass(frozen=True)
+class AddColumn:
+    """Add a model column missing from an existing table"""
+    table: str
+    column: str
+    # SQL literal existing rows get, needed for a NOT NULL column
+    default: Optional[str] = None
+    # Fills the new column for existing rows, in the same transaction
+    backfill: Optional[Callable[[Session], None]] = None
+
+    def pending(self, connection: Connection) -> bool:
+        return self.column not in {column["name"] for column in inspect(connection).get_columns(self.table)}
+
+    def apply(self, connection: Connection) -> None:
+        table = _table(self.table)
+        definition = str(CreateColumn(table.c[self.column]).compile(dialect=connection.dialect))
+        if self.default is not None:
+            definition += f" DEFAULT {self.default}"
+        name = connection.dialect.identifier_preparer.format_table(table)
+        connection.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {definition}")
+        if self.backfill is not None:
+            with Session(bind=connection) as session:
+                self.backfill(session)
+
+
+@dataclass(frozen=True)
+class AddIndex:
+    """Create a model index missing from an existing table"""
+    table: str
+    index: str
+
+    def pending(self, connection: Connection) -> bool:
+        return self.index not in {index["name"] for index in inspect(connection).get_indexes(self.table)}
+
+    def apply(self, connection: Connection) -> None:
+        next(index for index in _table(self.table).indexes if index.name == self.index).create(connection)
+
+
+@dataclass(frozen=True)
+class AddForeignKey:
+    """
+    Add the model's foreign key on `column` (MySQL only).
+
+    SQLite can't add constraints to an existing table and doesn't enforce
+    foreign keys by default, so it keeps the plain column.
+    """
+    table: str
+    column: str
+
+    def pending(self, connection: Connection) -> bool:
+        if connection.dialect.name != "mysql":
+            return False
+        return not any(
+            foreign_key["constrained_columns"] == [self.column]
+            for foreign_key in inspect(connection).get_foreign_keys(self.table)
+        )
+
+    def apply(self, connection: Connection) -> None:
+        constraint = next(
+            foreign_key.constraint for foreign_key in _table(self.table).foreign_keys
+            if foreign_key.parent.name == self.column
+        )
+        connection.execute(AddConstraint(constraint))
+
+
+@dataclass(frozen=True)
+class DropNotNull:
+    """Make an existing column nullable (MySQL only; SQLite can't alter a column in place)"""
+    table: str
+    column: str
+
+    def pending(self, connection: Connection) -> bool:
+        if connection.dialect.name != "mysql":
+            return False
+        column = next(column for column in inspect(connection).get_columns(self.table) if column["name"] == self.column)
+        return not column["nullable"]
+
+    def apply(self, connection: Connection) -> None:
+        table = _table(self.table)
+        preparer = connection.dialect.identifier_preparer
+        column_type = table.c[self.column].type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            f"ALTER TABLE {preparer.format_table(table)} MODIFY {preparer.quote(self.column)} {column_type} NULL"
+        )
+
+
+def _recount_rollups(session: Session) -> None:
+    # Imported here: order_rollups imports database, which runs these migrations
+    from order_rollups import rebuild_rollups
+    rebuild_rollups(session)
+
+
+# Changes to tables that existed before, oldest first. create_all creates
+# new tables with their current columns, so those need no entry here.
+MIGRATIONS = [
+    # Product search: MATCH ... AGAINST needs the FULLTEXT index on MySQL
+    AddIndex("products", "ft_products_name_description"),
+    # Product listing filters and sorts
+    AddIndex("products", "ix_products_category_price"),
+    AddIndex("products", "ix_products_provider_price"),
+    AddIndex("products", "ix_products_active_id"),
+    AddIndex("products", "ix_products_active_price"),
+    AddIndex("products", "ix_products_name_id"),
+    # Product order stats
+    AddColumn("orders", "quantity", default="1"),
+    AddIndex("orders", "ix_orders_product_stats"),
+    # Bulk upsert by SKU
+    AddColumn("products", "sku"),
+    AddIndex("products", "ix_products_sku"),
+    # Stock reservation; existing orders never reserved theirs
+    AddColumn("orders", "stock_reserved", default="0"),
+    # Idempotency claim leases
+    AddColumn("idempotency_keys", "claimed_at"),
+    # Checkout orders keep their products in order_items
+    DropNotNull("orders", "product_id"),
+    # Per-grouping order counts; the stored order_count counted checkout orders once per line
+    AddColumn("order_daily_rollups", "category_order_count", default="0"),
+    AddColumn("order_daily_rollups", "product_order_count", default="0", backfill=_recount_rollups),
+    # Provider feed sync
+    AddColumn("providers", "feed_url"),
+    AddColumn("providers", "feed_selectors"),
+    AddColumn("providers", "feed_interval_minutes"),
+    AddColumn("providers", "last_synced_at"),
+    AddColumn("providers", "last_sync_error"),
+    # Chat history by conversation; backfill_conversation_keys fills in the old messages
+    AddColumn("chats", "conversation_key"),
+    AddIndex("chats", "ix_chats_conversation_id"),
+    # Notification archiving and bulk updates
+    AddColumn("user_notifications", "is_archived", default="0"),
+    AddIndex("user_notifications", "ix_user_notifications_user_read_id"),
+    # Notification feed; older rows take the sender from their chat
+    AddColumn("user_notifications", "sender_id"),
+    AddForeignKey("user_notifications", "sender_id"),
+    AddIndex("user_notifications", "ix_user_notifications_user_created_id"),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    Bring tables created by an older version up to the current models.
+
+    create_all never alters an existing table, so each step checks the live
+    schema and only runs what is missing; a fresh database skips them all.
+    Runs at startup after create_all. Returns the steps applied.
+    """
+    applied = []
+    for step in MIGRATIONS:
+        try:
+            with engine.begin() as connection:
+                if not step.pending(connection):
+                    continue
+                step.apply(connection)
+        except DBAPIError:
+            # Another worker starting at the same time may have applied it first
+            with engine.connect() as connection:
+                if step.pending(connection):
+                    raise
+            continue
+        applied.append(repr(step))
+    return applied
@@ -0,0 +1,33 @@
+from sqlmodel import SQLModel
+from datetime import datetime
+from typing import Optional, List, Dict
+
+
+class GroupRevenue(SQLModel):
+    """Sales of one category or provider (id None groups the unassigned products)"""
+    id: Optional[int] = None
+    orders: int = 0
+    units: int = 0
+    revenue: float = 0.0
+
+class LowStockProduct(SQLModel):
+    id: int
+    name: str
+    quantity: int
+
+class CatalogAnalyticsResponse(SQLModel):
+    message: str
+    generated_at: datetime
+    product_count: int = 0
+    active_product_count: int = 0
+    stock_units: int = 0
+    stock_value: float = 0.0
+    order_count: int = 0
+    units_sold: int = 0
+    revenue_total: float = 0.0
+    revenue_by_category: List[GroupRevenue] = []
+    revenue_by_provider: List[GroupRevenue] = []
+    price_percentiles: Dict[str, float] = {}
+    # All low-stock products; `low_stock` lists the lowest `low_stock_limit` of them
+    low_stock_count: int = 0
+    low_stock: List[LowStockProduct] = []
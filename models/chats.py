@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from datetime import datetime
 from typing import Optional, List
@@ -12,8 +13,21 @@ class ChatType(str, Enum):
     GROUP = "group"
     BROADCAST = "broadcast"
 
+def conversation_key(user_id: int, receiver_id: Optional[int] = None, chat_room_id: Optional[int] = None) -> Optional[str]:
+    """Key shared by all messages of one conversation: the user pair of a private chat, else the room"""
+    if receiver_id:
+        low, high = sorted((user_id, receiver_id))
+        return f"u:{low}:{high}"
+    if chat_room_id:
+        return f"r:{chat_room_id}"
+    return None
+
 class Chat(SQLModel, table=True):
     __tablename__ = "chats"
+    __table_args__ = (
+        # A conversation's history is a range scan on this index, page by page
+        Index("ix_chats_conversation_id", "conversation_key", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     message: str
@@ -22,6 +36,7 @@ class Chat(SQLModel, table=True):
     receiver_id: Optional[int] = Field(default=None, foreign_key="user.id")  
     chat_room_id: Optional[int] = Field(default=None, foreign_key="chat_rooms.id")  
     parent_message_id: Optional[int] = Field(default=None, foreign_key="chats.id") 
+    conversation_key: Optional[str] = Field(default=None, max_length=64)
     
     is_read: bool = Field(default=False)
     read_at: Optional[datetime] = None
@@ -0,0 +1,20 @@
+from sqlmodel import Field, SQLModel, Column
+from sqlalchemy import LargeBinary
+from datetime import datetime
+from typing import Optional
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    """Stored outcome of a write request, replayed when its Idempotency-Key is reused"""
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the endpoint scope and the client's key
+    key: str = Field(primary_key=True, max_length=64)
+    # sha256 of the request payload, so a reused key with a different body is rejected
+    fingerprint: str = Field(max_length=64)
+    # NULL while the original request is still running
+    status_code: Optional[int] = None
+    body: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary, nullable=True))
+    # When the running request claimed the key; a pending claim older than the lease can be taken over
+    claimed_at: Optional[datetime] = None
+    expires_at: datetime = Field(index=True)
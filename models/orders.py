@@ -1,4 +1,5 @@
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Index
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 from enum import Enum
@@ -16,29 +17,66 @@ class OrderStatus(str, Enum):
     refunded = "refunded"
     failed = "failed"
 
+MAX_BATCH_ORDERS = 1000
+MAX_CHECKOUT_ITEMS = 200
+
+# Orders in these states don't count towards sales figures
+VOID_ORDER_STATUSES = (OrderStatus.cancelled, OrderStatus.refunded, OrderStatus.failed)
+
 class Order(SQLModel, table=True):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Covers the per-product aggregate query without touching the table rows
+        Index("ix_orders_product_stats", "product_id", "status", "created_at", "quantity", "total_amount"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     total_amount: float = Field(default=0.0)
+    quantity: int = Field(default=1)
     status: OrderStatus = Field(default=OrderStatus.pending)
+    # False for orders placed before stock was reserved; their units were never
+    # taken from stock, so they are never released or reserved again
+    stock_reserved: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
     user_id: int = Field(foreign_key="user.id")
     user: "User" = Relationship(back_populates="orders")
 
+    # NULL for checkout orders, whose products are in `items`
+    product_id: Optional[int] = Field(default=None, foreign_key="products.id")
+    product: Optional["Product"] = Relationship(back_populates="orders")
+
+    items: List["OrderItem"] = Relationship(
+        back_populates="order",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan"}
+    )
+
+class OrderItem(SQLModel, table=True):
+    """One product line of a checkout order, priced when the order was placed"""
+    __tablename__ = "order_items"
+    __table_args__ = (
+        Index("ix_order_items_product_order", "product_id", "order_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="orders.id", index=True)
+    order: "Order" = Relationship(back_populates="items")
     product_id: int = Field(foreign_key="products.id")
-    product: "Product" = Relationship(back_populates="orders")
+    quantity: int = Field(default=1)
+    unit_price: float = Field(default=0.0)
+    amount: float = Field(default=0.0)
 
 class OrderCreate(SQLModel):
     total_amount: float = Field(default=0.0)
+    quantity: int = Field(default=1, ge=1)
     status: OrderStatus = Field(default=OrderStatus.pending)
     user_id: int = Field(foreign_key="user.id")
     product_id: int = Field(foreign_key="products.id")
 
 class OrderUpdate(SQLModel):
     total_amount: Optional[float] = None
+    quantity: Optional[int] = Field(default=None, ge=1)
     status: Optional[OrderStatus] = None
     user_id: Optional[int] = None
     product_id: Optional[int] = None
@@ -46,11 +84,51 @@ class OrderUpdate(SQLModel):
 class OrderResponse(SQLModel):
     id: int
     total_amount: float
+    quantity: int
     status: OrderStatus
     created_at: datetime
     updated_at: datetime
     user_id: int
+    product_id: Optional[int] = None
+
+class OrderItemResponse(SQLModel):
+    product_id: int
+    quantity: int
+    unit_price: float
+    amount: float
+
+class OrderDetailResponse(OrderResponse):
+    items: List[OrderItemResponse] = []
+
+class CheckoutItem(SQLModel):
     product_id: int
+    quantity: int = Field(default=1, ge=1)
+
+class OrderCheckout(SQLModel):
+    """A cart: prices and the total are taken from the products at checkout"""
+    user_id: int
+    status: OrderStatus = Field(default=OrderStatus.pending)
+    items: List[CheckoutItem] = Field(min_length=1, max_length=MAX_CHECKOUT_ITEMS)
+
+class OrderBatchCreate(SQLModel):
+    orders: List[OrderCreate] = Field(min_length=1, max_length=MAX_BATCH_ORDERS)
+
+class OrderBatchItemResult(SQLModel):
+    index: int
+    success: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class OrderBatchResponse(SQLModel):
+    message: str
+    created: int = 0
+    failed: int = 0
+    results: List[OrderBatchItemResult] = []
+
+class OrderListResponse(SQLModel):
+    message: str
+    data: List[OrderResponse] = []
+    next_cursor: Optional[str] = None
 
 from models.users import User
 from models.products import Product
\ No newline at end of file
@@ -1,6 +1,8 @@
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Index
 from typing import Optional, List, TYPE_CHECKING
 from datetime import datetime
+from enum import Enum
 
 if TYPE_CHECKING:
     from models.categories import Category
@@ -8,12 +10,23 @@ if TYPE_CHECKING:
     from models.users import User
     from models.providers import Provider
     from models.orders import Order
-    from models.orders import OrderResponse
 
 class Product(SQLModel, table=True):
     __tablename__ = "products"
+    __table_args__ = (
+        # FULLTEXT on MySQL; other dialects ignore the prefix and get a plain index
+        Index("ft_products_name_description", "name", "description", mysql_prefix="FULLTEXT"),
+        # Listing indexes: filter column(s) first, then the sort key, then id as tie-breaker.
+        # The foreign key indexes on category_id/provider_id already cover "newest/oldest".
+        Index("ix_products_category_price", "category_id", "price", "id"),
+        Index("ix_products_provider_price", "provider_id", "price", "id"),
+        Index("ix_products_active_id", "is_active", "id"),
+        Index("ix_products_active_price", "is_active", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
+    sku: Optional[str] = Field(default=None, unique=True, index=True, max_length=64)
     name: str
     description: Optional[str] = None
     price: Optional[float] = None
@@ -35,6 +48,7 @@ class Product(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class ProductCreate(SQLModel):
+    sku: Optional[str] = Field(default=None, max_length=64)
     name: str
     description: Optional[str] = None
     price: Optional[float] = None
@@ -45,6 +59,7 @@ class ProductCreate(SQLModel):
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
 
 class ProductUpdate(SQLModel):
+    sku: Optional[str] = Field(default=None, max_length=64)
     name: Optional[str] = None
     description: Optional[str] = None
     price: Optional[float] = None
@@ -54,8 +69,15 @@ class ProductUpdate(SQLModel):
     provider_id: Optional[int] = Field(default=None, foreign_key="providers.id")
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
 
+class ProductOrderStats(SQLModel):
+    order_count: int = 0
+    units: int = 0
+    revenue: float = 0.0
+    last_order_at: Optional[datetime] = None
+
 class ProductResponse(SQLModel):
     id: int
+    sku: Optional[str] = None
     name: str
     description: Optional[str]
     price: Optional[float]
@@ -66,10 +88,59 @@ class ProductResponse(SQLModel):
     created_at: datetime
     updated_at: datetime
     user_id: Optional[int]
-    orders: List["OrderResponse"] = []
+    # Price after the best live promotion, and which promotion gave it
+    effective_price: Optional[float] = None
+    promotion_id: Optional[int] = None
+    order_stats: Optional[ProductOrderStats] = None
+
+class ProductListResponse(SQLModel):
+    message: str
+    data: List[ProductResponse] = []
+    next_cursor: Optional[str] = None
+
+class ProductUpsertRow(SQLModel):
+    """One row of a bulk upsert payload, keyed by the external SKU"""
+    sku: str = Field(min_length=1, max_length=64)
+    name: str = Field(min_length=1)
+    description: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    is_active: bool = True
+    category_id: Optional[int] = None
+    provider_id: Optional[int] = None
+
+class BulkUpsertError(SQLModel):
+    line: int
+    error: str
+
+class BulkUpsertResult(SQLModel):
+    message: str
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[BulkUpsertError] = []
+
+class ProductSearchResponse(ProductResponse):
+    score: float
+
+class ProductFilter(SQLModel):
+    category_id: Optional[int] = None
+    provider_id: Optional[int] = None
+    is_active: Optional[bool] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+
+class ProductSort(str, Enum):
+    newest = "newest"
+    oldest = "oldest"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+    name_asc = "name_asc"
+    name_desc = "name_desc"
 
 from models.providers import Provider  
 from models.categories import Category      
 from models.images import Image       
 from models.users import User
-from models.orders import Order, OrderResponse       
+from models.orders import Order
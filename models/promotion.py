@@ -0,0 +1,91 @@
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Index
+from pydantic import field_validator, model_validator
+from datetime import datetime, timezone
+from typing import Optional
+from enum import Enum
+
+
+class DiscountType(str, Enum):
+    percentage = "percentage"
+    fixed = "fixed"
+
+class PromotionScope(str, Enum):
+    product = "product"
+    category = "category"
+    provider = "provider"
+
+class Promotion(SQLModel, table=True):
+    """
+    A discount on one product, or on every product of a category or provider.
+
+    Promotions don't stack: a product gets the lowest price any applicable
+    promotion gives it. The window (UTC) is open-ended when a bound is NULL.
+    """
+    __tablename__ = "promotions"
+    __table_args__ = (
+        Index("ix_promotions_scope_target", "scope", "target_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    discount_type: DiscountType
+    # Percent off (0-100] or an amount off the price
+    value: float
+    scope: PromotionScope
+    target_id: int
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = Field(default=None, index=True)
+    is_active: bool = Field(default=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class _PromotionRules(SQLModel):
+    @field_validator("starts_at", "ends_at", check_fields=False)
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        """Windows are stored and compared as naive UTC; convert aware datetimes"""
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @model_validator(mode="after")
+    def check_rules(self):
+        if self.discount_type == DiscountType.percentage and self.value is not None and self.value > 100:
+            raise ValueError("A percentage discount can't exceed 100")
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        return self
+
+class PromotionCreate(_PromotionRules):
+    name: str
+    discount_type: DiscountType
+    value: float = Field(gt=0)
+    scope: PromotionScope
+    target_id: int
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    is_active: bool = True
+
+class PromotionUpdate(_PromotionRules):
+    name: Optional[str] = None
+    discount_type: Optional[DiscountType] = None
+    value: Optional[float] = Field(default=None, gt=0)
+    scope: Optional[PromotionScope] = None
+    target_id: Optional[int] = None
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    is_active: Optional[bool] = None
+
+class PromotionResponse(SQLModel):
+    id: int
+    name: str
+    discount_type: DiscountType
+    value: float
+    scope: PromotionScope
+    target_id: int
+    starts_at: Optional[datetime]
+    ends_at: Optional[datetime]
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
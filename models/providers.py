@@ -1,6 +1,7 @@
-from sqlmodel import Field, SQLModel, Relationship
+from sqlmodel import Field, SQLModel, Relationship, Column
+from sqlalchemy import JSON
 from datetime import datetime
-from typing import Optional, List, TYPE_CHECKING
+from typing import Optional, List, Dict, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from models.users import User
@@ -15,6 +16,16 @@ class Provider(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Supplier page scraped by the feed sync. feed_selectors maps Product
+    # fields (sku, name, price, quantity, description) to CSS selectors that
+    # match one element per product; sku is required.
+    feed_url: Optional[str] = None
+    feed_selectors: Optional[Dict[str, str]] = Field(default=None, sa_column=Column(JSON, nullable=True))
+    # Minutes between scheduled syncs, NULL to only sync on demand
+    feed_interval_minutes: Optional[int] = None
+    last_synced_at: Optional[datetime] = None
+    last_sync_error: Optional[str] = None
+
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     user: Optional["User"] = Relationship(back_populates="providers")
 
@@ -23,22 +34,55 @@ class Provider(SQLModel, table=True):
 class ProviderCreate(SQLModel):
     name: str
     description: Optional[str] = None
+    feed_url: Optional[str] = None
+    feed_selectors: Optional[Dict[str, str]] = None
+    feed_interval_minutes: Optional[int] = Field(default=None, ge=1)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
 
 class ProviderUpdate(SQLModel):
     name: Optional[str] = None
     description: Optional[str] = None
+    feed_url: Optional[str] = None
+    feed_selectors: Optional[Dict[str, str]] = None
+    feed_interval_minutes: Optional[int] = Field(default=None, ge=1)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
 
+class ProviderProductStats(SQLModel):
+    product_count: int = 0
+    active_count: int = 0
+    # Units in stock over the products that track stock
+    stock_units: int = 0
+
 class ProviderResponse(SQLModel):
     id: int
     name: str
     description: Optional[str]
     created_at: datetime
     updated_at: datetime
+    feed_url: Optional[str] = None
+    feed_selectors: Optional[Dict[str, str]] = None
+    feed_interval_minutes: Optional[int] = None
+    last_synced_at: Optional[datetime] = None
+    last_sync_error: Optional[str] = None
     user_id: Optional[int]
+    product_stats: ProviderProductStats = ProviderProductStats()
     products: List["ProductResponse"] = []
 
+class FeedSyncResult(SQLModel):
+    message: str
+    provider_id: int
+    scraped: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Entries without a usable sku or name
+    skipped: int = 0
+
+class ProviderListResponse(SQLModel):
+    message: str
+    data: List[ProviderResponse] = []
+    next_cursor: Optional[str] = None
+
 from models.products import Product, ProductResponse  
 from models.users import User
 
@@ -0,0 +1,43 @@
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Index, UniqueConstraint
+from datetime import date
+from typing import Optional
+from enum import Enum
+
+from models.orders import OrderStatus
+
+
+class OrderDailyRollup(SQLModel, table=True):
+    """Orders per day x status x product, kept up to date by the order endpoints"""
+    __tablename__ = "order_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "status", "product_id", name="uq_order_daily_rollups_key"),
+        Index("ix_order_daily_rollups_day_category", "day", "category_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date
+    status: OrderStatus
+    product_id: int = Field(index=True)
+    category_id: Optional[int] = None
+    # A checkout order has a row per product, so each grouping counts it once
+    # with its own measure: once per day x status, once per category, once per product
+    order_count: int = Field(default=0)
+    category_order_count: int = Field(default=0)
+    product_order_count: int = Field(default=0)
+    units: int = Field(default=0)
+    revenue: float = Field(default=0.0)
+
+class RollupGrouping(str, Enum):
+    day = "day"
+    product = "product"
+    category = "category"
+
+class OrderReportRow(SQLModel):
+    day: date
+    status: OrderStatus
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    order_count: int
+    units: int
+    revenue: float
@@ -1,4 +1,5 @@
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from pydantic import EmailStr
 from datetime import datetime
@@ -35,7 +36,7 @@ class User(SQLModel, table=True):
     chats: List["Chat"] = Relationship(back_populates="sender", sa_relationship_kwargs={"foreign_keys": "Chat.sender_id"})
     received_chats: List["Chat"] = Relationship(back_populates="receiver", sa_relationship_kwargs={"foreign_keys": "Chat.receiver_id"})
     user_chats: List["UserChat"] = Relationship(back_populates="user")
-    notifications: List["UserNotification"] = Relationship(back_populates="user")
+    notifications: List["UserNotification"] = Relationship(back_populates="user", sa_relationship_kwargs={"foreign_keys": "UserNotification.user_id"})
     products: List["Product"] = Relationship(back_populates="user")
     providers: List["Provider"] = Relationship(back_populates="user")
     orders: List["Order"] = Relationship(back_populates="user")
@@ -103,6 +104,12 @@ class RefreshTokenRequest(SQLModel):
 
 class UserNotification(SQLModel, table=True):
     __tablename__ = "user_notifications"
+    __table_args__ = (
+        # A user's unread notifications in id order, for counts and chunked bulk updates
+        Index("ix_user_notifications_user_read_id", "user_id", "is_read", "id"),
+        # The feed, newest first
+        Index("ix_user_notifications_user_created_id", "user_id", "created_at", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
@@ -111,7 +118,25 @@ class UserNotification(SQLModel, table=True):
     notification_type: str = Field(default="info") 
     is_read: bool = Field(default=False)
     read_at: Optional[datetime] = None
+    is_archived: bool = Field(default=False)
     related_chat_id: Optional[int] = Field(default=None, foreign_key="chats.id")
+    # Copied from the related chat so the feed doesn't need to look it up
+    sender_id: Optional[int] = Field(default=None, foreign_key="user.id")
     created_at: datetime = Field(default_factory=datetime.now)
     
-    user: "User" = Relationship(back_populates="notifications")
\ No newline at end of file
+    user: "User" = Relationship(back_populates="notifications", sa_relationship_kwargs={"foreign_keys": "UserNotification.user_id"})
+
+
+class UnreadCounter(SQLModel, table=True):
+    """
+    Unread notifications of a user, maintained with the notifications.
+
+    The row with an empty conversation_key counts all of the user's unread,
+    unarchived notifications; the others count the chat notifications of
+    one conversation (see models.chats.conversation_key).
+    """
+    __tablename__ = "unread_counters"
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    conversation_key: str = Field(default="", primary_key=True, max_length=64)
+    count: int = Field(default=0)
\ No newline at end of file
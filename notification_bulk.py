@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.sql import ColumnElement
+from sqlmodel import Session, select
+from starlette.config import Config
+
+import database
+from models.chats import Chat
+from models.users import UserNotification
+from unread_counters import recount_unread, unread_counters
+
+config = Config(".env")
+
+# Rows changed per statement (and transaction), keeping each lock short
+NOTIFICATION_BULK_CHUNK = config("NOTIFICATION_BULK_CHUNK", cast=int, default=5000)
+
+notifications = UserNotification.__table__
+
+
+def _in_chunks(user_id: int, conditions: List[ColumnElement],
+               statement: Callable[[List[ColumnElement]], object]) -> int:
+    """
+    Run a bulk UPDATE/DELETE over a user's matching notifications in id ranges.
+
+    Each range holds at most NOTIFICATION_BULK_CHUNK matching rows and is
+    committed on its own. The user's unread counters are recounted at the
+    end. Blocking; returns the number of rows affected.
+    """
+    matching = [notifications.c.user_id == user_id, *conditions]
+    affected, last_id = 0, 0
+    with Session(database.engine) as session:
+        while True:
+            # The id closing this range: the chunk's last matching row, if there are that many left
+            upper = session.exec(
+                select(notifications.c.id).where(*matching, notifications.c.id > last_id)
+                .order_by(notifications.c.id).offset(NOTIFICATION_BULK_CHUNK - 1).limit(1)
+            ).first()
+            window = [*matching, notifications.c.id > last_id]
+            if upper is not None:
+                window.append(notifications.c.id <= upper)
+            affected += session.exec(statement(window)).rowcount
+            session.commit()
+            if upper is None:
+                break
+            last_id = upper
+        if affected:
+            recount_unread(session, user_id)
+            session.commit()
+    if affected:
+        unread_counters.invalidate(user_id)
+    return affected
+
+
+def mark_read(user_id: int, up_to_id: Optional[int] = None, before: Optional[datetime] = None,
+              conversation_key: Optional[str] = None) -> int:
+    """Mark a user's unread notifications read, optionally only up to an id/time or of one conversation"""
+    conditions = [notifications.c.is_read == False]
+    if up_to_id is not None:
+        conditions.append(notifications.c.id <= up_to_id)
+    if before is not None:
+        conditions.append(notifications.c.created_at <= before)
+    if conversation_key is not None:
+        conditions.append(notifications.c.related_chat_id.in_(
+            select(Chat.id).where(Chat.conversation_key == conversation_key)
+        ))
+    now = datetime.now()
+    return _in_chunks(
+        user_id, conditions,
+        lambda window: update(notifications).where(*window).values(is_read=True, read_at=now)
+    )
+
+
+def archive_older_than(user_id: int, older_than: datetime) -> int:
+    """Archive a user's notifications created before `older_than`"""
+    conditions = [notifications.c.is_archived == False, notifications.c.created_at < older_than]
+    return _in_chunks(
+        user_id, conditions,
+        lambda window: update(notifications).where(*window).values(is_archived=True)
+    )
+
+
+def delete_older_than(user_id: int, older_than: datetime, only_read: bool = False) -> int:
+    """Delete a user's notifications created before `older_than` (only read ones with `only_read`)"""
+    conditions = [notifications.c.created_at < older_than]
+    if only_read:
+        conditions.append(notifications.c.is_read == True)
+    return _in_chunks(user_id, conditions, lambda window: delete(notifications).where(*window))
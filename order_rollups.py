@@ -0,0 +1,162 @@
+import argparse
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert
+from sqlmodel import Session, select
+
+import database
+from aggregates import order_lines
+from database import upsert_statement
+from migrations import run_migrations
+from models.orders import Order, OrderItem
+from models.products import Product
+from models.reports import OrderDailyRollup
+
+ROLLUP_KEY = ["day", "status", "product_id"]
+ROLLUP_MEASURES = ["order_count", "category_order_count", "product_order_count", "units", "revenue"]
+
+
+def order_delta(order, sign: int = 1) -> Dict:
+    """The contribution of one order to its rollup row, negated with sign=-1"""
+    return {
+        "day": order.created_at.date(),
+        "status": order.status,
+        "product_id": order.product_id,
+        "order_count": sign,
+        "category_order_count": sign,
+        "product_order_count": sign,
+        "units": sign * order.quantity,
+        "revenue": sign * order.total_amount,
+    }
+
+
+def order_deltas(order, items: Iterable[OrderItem] = (), sign: int = 1) -> List[Dict]:
+    """
+    Like `order_delta`, but one delta per line for checkout orders.
+
+    The order is counted on its line with the lowest product id;
+    `apply_rollup_deltas` sets category_order_count once it knows the
+    products' categories.
+    """
+    items = list(items)
+    if not items:
+        return [order_delta(order, sign)]
+    first = min(item.product_id for item in items)
+    return [
+        {
+            "day": order.created_at.date(),
+            "status": order.status,
+            "product_id": item.product_id,
+            "order_id": order.id,
+            "order_count": sign if item.product_id == first else 0,
+            "product_order_count": sign,
+            "units": sign * item.quantity,
+            "revenue": sign * item.amount,
+        }
+        for item in items
+    ]
+
+
+def apply_rollup_deltas(session: Session, deltas: Iterable[Dict]) -> None:
+    """
+    Add order deltas to the daily rollups inside the caller's transaction.
+
+    Deltas for the same row are merged first, then applied with one
+    multi-row upsert that increments the stored measures.
+    """
+    deltas = list(deltas)
+    if not deltas:
+        return
+    categories = dict(session.exec(
+        select(Product.id, Product.category_id).where(Product.id.in_({delta["product_id"] for delta in deltas}))
+    ).all())
+    # A checkout order counts once per category, on its line with the lowest product id there
+    firsts: Dict[Tuple, int] = {}
+    for delta in deltas:
+        if "order_id" in delta:
+            key = (delta["order_id"], categories.get(delta["product_id"]), delta["product_order_count"])
+            firsts[key] = min(firsts.get(key, delta["product_id"]), delta["product_id"])
+
+    merged: Dict[Tuple, Dict] = {}
+    for delta in deltas:
+        category_id = categories.get(delta["product_id"])
+        if "order_id" in delta:
+            key = (delta["order_id"], category_id, delta["product_order_count"])
+            first = firsts[key] == delta["product_id"]
+            delta = {**delta, "category_order_count": delta["product_order_count"] if first else 0}
+        key = tuple(delta[column] for column in ROLLUP_KEY)
+        row = merged.setdefault(key, {
+            **dict(zip(ROLLUP_KEY, key)), "category_id": category_id, **{m: 0 for m in ROLLUP_MEASURES}
+        })
+        for measure in ROLLUP_MEASURES:
+            row[measure] += delta[measure]
+    rows = [row for row in merged.values() if any(row[measure] for measure in ROLLUP_MEASURES)]
+    if not rows:
+        return
+    session.exec(upsert_statement(
+        session, OrderDailyRollup, rows, ROLLUP_KEY,
+        update_columns=["category_id"], increment_columns=ROLLUP_MEASURES
+    ))
+
+
+def rebuild_rollups(session: Session, since: Optional[date] = None) -> int:
+    """
+    Recompute the rollups from the orders and order_items tables (from `since` on, or all).
+
+    Runs as one DELETE plus one INSERT ... SELECT in a single transaction.
+    Orders are counted on their lowest product id, overall and per category,
+    like `apply_rollup_deltas` does. Returns the number of rollup rows written.
+    """
+    clear = delete(OrderDailyRollup.__table__)
+    start = None
+    if since is not None:
+        start = datetime.combine(since, datetime.min.time())
+        clear = clear.where(OrderDailyRollup.day >= since)
+    lines = order_lines(since=start)
+    lowest = func.min(lines.c.product_id)
+    ranked = (
+        select(
+            lines,
+            Product.category_id,
+            (lines.c.product_id == lowest.over(partition_by=lines.c.order_id)).label("first_of_order"),
+            (lines.c.product_id == lowest.over(partition_by=(lines.c.order_id, Product.category_id))).label("first_of_category")
+        )
+        .select_from(lines)
+        .outerjoin(Product, Product.id == lines.c.product_id)
+        .subquery("ranked_lines")
+    )
+    day = func.date(ranked.c.created_at)
+    source = (
+        select(
+            day,
+            ranked.c.status,
+            ranked.c.product_id,
+            ranked.c.category_id,
+            func.sum(case((ranked.c.first_of_order, 1), else_=0)),
+            func.sum(case((ranked.c.first_of_category, 1), else_=0)),
+            func.count(ranked.c.order_id),
+            func.sum(ranked.c.units),
+            func.sum(ranked.c.amount)
+        )
+        .group_by(day, ranked.c.status, ranked.c.product_id, ranked.c.category_id)
+    )
+    session.exec(clear)
+    columns = ROLLUP_KEY + ["category_id"] + ROLLUP_MEASURES
+    result = session.exec(insert(OrderDailyRollup.__table__).from_select(columns, source))
+    session.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the daily order rollups from the orders table")
+    parser.add_argument("--since", type=date.fromisoformat, help="only rebuild days from this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    # Register every model, as importing the app does, before touching the schema
+    from models import analytics, categories, chats, idempotency, images, orders, products, promotion, providers, reports, users  # noqa: F401
+    # Also brings a database from an older version up to the current rollup columns
+    database.create_db_and_tables()
+    run_migrations(database.engine)
+    with Session(database.engine) as session:
+        written = rebuild_rollups(session, args.since)
+    print(f"Rebuilt {written} rollup rows")
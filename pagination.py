@@ -0,0 +1,71 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, or_
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(column, value: Any) -> Any:
+    """Convert a decoded cursor value back to the column's type, or raise ValueError"""
+    # TypeDecorators such as SQLModel's AutoString only know their type through impl
+    column_type = getattr(column.type, "impl_instance", column.type)
+    if isinstance(column_type, DateTime):
+        if not isinstance(value, str):
+            raise ValueError(f"expected a timestamp for {column.name}")
+        return datetime.fromisoformat(value)
+    expected = column_type.python_type
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+        raise ValueError(f"expected {expected.__name__} for {column.name}")
+    return value
+
+
+def decode_cursor(cursor: str, order: Sequence[Tuple[Any, bool]]) -> List[Any]:
+    """
+    Decode a cursor made by encode_cursor for a page sorted by `order`.
+
+    Values are checked against and converted to their column's type, so a
+    forged or garbled cursor is a 400 rather than a failing query.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(order):
+            raise ValueError("wrong number of values")
+        return [_cursor_value(column, value) for (column, _), value in zip(order, values)]
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def keyset_condition(order: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    """
+    Build the WHERE clause selecting rows strictly after `values`.
+
+    `order` is the list of (column, descending) pairs the page is sorted by;
+    the last one must be unique (usually the primary key). The condition is
+    expanded into OR-ed equality prefixes so it can use a composite index on
+    every dialect. `values` come from decode_cursor.
+    """
+    clauses = []
+    for position, (column, descending) in enumerate(order):
+        prefix = [order[i][0] == values[i] for i in range(position)]
+        step = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+
+def order_by_clause(order: Sequence[Tuple[Any, bool]]):
+    return [column.desc() if descending else column.asc() for column, descending in order]
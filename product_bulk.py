@@ -0,0 +1,151 @@
+import csv
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple
+
+import anyio
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+import database
+from database import upsert_statement
+from models.products import BulkUpsertError, BulkUpsertResult, Product, ProductUpsertRow
+from product_search import product_index
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+
+class FeedFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+UPSERT_COLUMNS = [
+    "name", "description", "price", "quantity", "is_active", "category_id", "provider_id", "updated_at"
+]
+
+# Values a new product gets for the fields its row leaves out
+_INSERT_DEFAULTS = {
+    name: field.default for name, field in ProductUpsertRow.model_fields.items() if not field.is_required()
+}
+
+
+def upsert_products(session: Session, rows: List[Dict]) -> Tuple[int, int]:
+    """
+    Insert or update products keyed by SKU.
+
+    Rows are dicts of the ProductUpsertRow fields that were provided. An
+    existing product only has those fields updated; a new one gets the
+    defaults for the rest. A SKU repeated within `rows` merges its
+    occurrences, later ones winning. Rows are grouped by the fields they
+    set, one statement per group. Returns (created, updated). The caller
+    owns the transaction.
+    """
+    by_sku: Dict[str, Dict] = {}
+    for row in rows:
+        by_sku[row["sku"]] = {**by_sku.get(row["sku"], {}), **row}
+    if not by_sku:
+        return 0, 0
+    existing = set(session.exec(select(Product.sku).where(Product.sku.in_(list(by_sku)))).all())
+    now = datetime.utcnow()
+    groups: Dict[Tuple[str, ...], List[Dict]] = {}
+    for row in by_sku.values():
+        columns = tuple(column for column in UPSERT_COLUMNS if column in row) + ("updated_at",)
+        groups.setdefault(columns, []).append({**_INSERT_DEFAULTS, **row, "created_at": now, "updated_at": now})
+    for columns, values in groups.items():
+        session.exec(upsert_statement(session, Product, values, ["sku"], update_columns=list(columns)))
+    return len(by_sku) - len(existing), len(existing)
+
+
+def iter_body_lines(stream: AsyncIterator[bytes]) -> Iterator[str]:
+    """
+    Read a request body line by line from a worker thread.
+
+    Chunks are pulled from the event loop on demand, so only one chunk
+    and one partial line are held in memory at a time.
+    """
+    buffer = b""
+    while True:
+        try:
+            chunk = anyio.from_thread.run(stream.__anext__)
+        except StopAsyncIteration:
+            break
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
+    if buffer:
+        yield buffer.decode("utf-8")
+
+
+def parse_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, e
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # Empty cells mean "not provided": the stored value is kept
+        yield reader.line_num, {key: value for key, value in record.items() if key and value not in ("", None)}
+
+
+def run_bulk_upsert(lines: Iterable[str], format: FeedFormat) -> BulkUpsertResult:
+    """Validate and upsert a product feed in chunks, one transaction per chunk"""
+    result = BulkUpsertResult(message="Bulk upsert finished")
+    records = parse_csv(lines) if format == FeedFormat.csv else parse_ndjson(lines)
+
+    def fail(line: int, error: str) -> None:
+        result.failed += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(BulkUpsertError(line=line, error=error))
+
+    def flush(chunk: List[Tuple[int, Dict]]) -> None:
+        with Session(database.engine) as session:
+            try:
+                created, updated = upsert_products(session, [row for _, row in chunk])
+                session.commit()
+                result.created += created
+                result.updated += updated
+                return
+            except SQLAlchemyError:
+                session.rollback()
+            # Something in the chunk was rejected (e.g. unknown category_id): retry row by row
+            for line, row in chunk:
+                try:
+                    created, updated = upsert_products(session, [row])
+                    session.commit()
+                    result.created += created
+                    result.updated += updated
+                except SQLAlchemyError as e:
+                    session.rollback()
+                    fail(line, str(e.orig) if getattr(e, "orig", None) else str(e))
+
+    chunk: List[Tuple[int, Dict]] = []
+    for line, record in records:
+        if isinstance(record, Exception):
+            fail(line, f"Invalid JSON: {record}")
+            continue
+        try:
+            row = ProductUpsertRow.model_validate(record)
+        except ValidationError as e:
+            fail(line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        chunk.append((line, row.model_dump(exclude_unset=True)))
+        if len(chunk) >= CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if result.created or result.updated:
+        product_index.invalidate()
+    return result
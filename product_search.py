@@ -0,0 +1,201 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.mysql import match
+from sqlmodel import Session, select
+from starlette.config import Config
+
+from models.products import Product, ProductFilter
+
+config = Config(".env")
+
+# The index is kept current by this process's product endpoints; the TTL
+# bounds how long another worker's product writes can go unseen
+PRODUCT_SEARCH_INDEX_TTL = config("PRODUCT_SEARCH_INDEX_TTL", cast=float, default=60.0)
+# Ranked ids checked against the filters per query
+SEARCH_FILTER_CHUNK = 500
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MIN_TOKEN_LENGTH = 2
+NAME_WEIGHT = 2
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase word tokens, ignoring very short ones"""
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) >= MIN_TOKEN_LENGTH]
+
+
+def apply_product_filter(statement, filters: Optional[ProductFilter]):
+    """Add the WHERE clauses of a ProductFilter to a select statement"""
+    if filters is None:
+        return statement
+    if filters.category_id is not None:
+        statement = statement.where(Product.category_id == filters.category_id)
+    if filters.provider_id is not None:
+        statement = statement.where(Product.provider_id == filters.provider_id)
+    if filters.is_active is not None:
+        statement = statement.where(Product.is_active == filters.is_active)
+    if filters.min_price is not None:
+        statement = statement.where(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        statement = statement.where(Product.price <= filters.max_price)
+    if filters.in_stock is True:
+        # NULL quantity means stock is not tracked for the product
+        statement = statement.where(or_(Product.quantity.is_(None), Product.quantity > 0))
+    elif filters.in_stock is False:
+        statement = statement.where(Product.quantity <= 0)
+    return statement
+
+
+class ProductSearchIndex:
+    """
+    In-process inverted index over product name/description.
+
+    Used when the database has no FULLTEXT support (SQLite in development
+    and tests). The index is loaded from the database on first use and is
+    then kept up to date by this process's product write endpoints; it is
+    reloaded after PRODUCT_SEARCH_INDEX_TTL to pick up other workers' writes.
+    """
+
+    def __init__(self, ttl: float = PRODUCT_SEARCH_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._expires = 0.0
+
+    @staticmethod
+    def _terms(name: Optional[str], description: Optional[str]) -> Counter:
+        terms = Counter(tokenize(description))
+        for token in tokenize(name):
+            terms[token] += NAME_WEIGHT
+        return terms
+
+    def load(self, session: Session) -> None:
+        """(Re)build the whole index from the products table"""
+        rows = session.exec(select(Product.id, Product.name, Product.description)).all()
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0
+            for product_id, name, description in rows:
+                self._add(product_id, self._terms(name, description))
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        """Drop the index so that the next search reloads it"""
+        with self._lock:
+            self._expires = 0.0
+
+    def add(self, product: Product) -> None:
+        """Index a new product or re-index an updated one"""
+        with self._lock:
+            if not self._loaded():
+                return
+            self._remove(product.id)
+            self._add(product.id, self._terms(product.name, product.description))
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            if self._loaded():
+                self._remove(product_id)
+
+    def _loaded(self) -> bool:
+        return self._expires > time.monotonic()
+
+    def _add(self, product_id: int, terms: Counter) -> None:
+        self._doc_terms[product_id] = terms
+        self._doc_lengths[product_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[product_id]
+        for token, frequency in terms.items():
+            self._postings.setdefault(token, {})[product_id] = frequency
+
+    def _remove(self, product_id: int) -> None:
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(product_id)
+        for token in terms:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def search(self, session: Session, query: str) -> List[Tuple[int, float]]:
+        """Return (product_id, score) pairs ranked by BM25 relevance"""
+        with self._lock:
+            if not self._loaded():
+                self.load(session)
+            doc_count = len(self._doc_terms)
+            if doc_count == 0:
+                return []
+            average_length = self._total_length / doc_count
+            scores: Dict[int, float] = {}
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, frequency in postings.items():
+                    norm = K1 * (1 - B + B * self._doc_lengths[product_id] / average_length)
+                    scores[product_id] = scores.get(product_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+product_index = ProductSearchIndex()
+
+
+def search_products(
+    session: Session,
+    query: str,
+    filters: Optional[ProductFilter] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Tuple[Product, float]]:
+    """
+    Relevance-ranked full-text search over products.
+
+    Uses MATCH ... AGAINST on MySQL and the in-process index elsewhere.
+    The index ranks the ids; filters are checked in SQL a chunk of ranked
+    ids at a time until the page is full, and only the page is loaded.
+    """
+    if session.get_bind().dialect.name == "mysql":
+        score = match(Product.name, Product.description, against=query).in_natural_language_mode().label("score")
+        statement = select(Product, score).where(score > 0)
+        statement = apply_product_filter(statement, filters)
+        statement = statement.order_by(score.desc(), Product.id).limit(limit).offset(offset)
+        return [(product, float(value)) for product, value in session.exec(statement).all()]
+
+    ranked = product_index.search(session, query)
+    matching: List[Tuple[int, float]] = []
+    for start in range(0, len(ranked), SEARCH_FILTER_CHUNK):
+        chunk = ranked[start:start + SEARCH_FILTER_CHUNK]
+        statement = select(Product.id).where(Product.id.in_([product_id for product_id, _ in chunk]))
+        passing = set(session.exec(apply_product_filter(statement, filters)).all())
+        matching.extend(item for item in chunk if item[0] in passing)
+        if len(matching) >= offset + limit:
+            break
+    page = matching[offset:offset + limit]
+    if not page:
+        return []
+    products = {
+        product.id: product
+        for product in session.exec(select(Product).where(Product.id.in_([product_id for product_id, _ in page]))).all()
+    }
+    return [(products[product_id], score) for product_id, score in page if product_id in products]
@@ -0,0 +1,150 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlmodel import Session, select
+from starlette.config import Config
+
+from models.products import ProductResponse
+from models.promotion import DiscountType, Promotion, PromotionScope
+
+config = Config(".env")
+
+# The index is kept current by this process's promotion endpoints; the TTL
+# bounds how long changes made through another worker go unseen
+PROMOTION_INDEX_TTL = config("PROMOTION_INDEX_TTL", cast=float, default=60.0)
+
+
+@dataclass(frozen=True)
+class _Rule:
+    id: int
+    discount_type: DiscountType
+    value: float
+    starts_at: Optional[datetime]
+    ends_at: Optional[datetime]
+
+    def live(self, at: datetime) -> bool:
+        return (self.starts_at is None or self.starts_at <= at) and (self.ends_at is None or at < self.ends_at)
+
+    def apply(self, price: float) -> float:
+        if self.discount_type == DiscountType.percentage:
+            return round(price * (1 - self.value / 100), 2)
+        return round(max(price - self.value, 0.0), 2)
+
+
+class PromotionIndex:
+    """
+    Active promotions compiled into per-target lookup tables.
+
+    Rules are keyed by (scope, target id), so pricing a page of products
+    costs three dict lookups per product regardless of how many
+    promotions exist. Create/update/delete keep the index current one
+    promotion at a time; the whole index is only loaded on first use and
+    after PROMOTION_INDEX_TTL.
+    """
+
+    def __init__(self, ttl: float = PROMOTION_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._targets: Dict[Tuple[PromotionScope, int], Dict[int, _Rule]] = {}
+        self._keys: Dict[int, Tuple[PromotionScope, int]] = {}
+        self._expires = 0.0
+
+    def load(self, session: Session) -> None:
+        """(Re)build the index from the promotions that are active and not over"""
+        promotions = session.exec(
+            select(Promotion).where(
+                Promotion.is_active,
+                or_(Promotion.ends_at.is_(None), Promotion.ends_at > datetime.utcnow())
+            )
+        ).all()
+        with self._lock:
+            self._targets = {}
+            self._keys = {}
+            for promotion in promotions:
+                self._put(promotion)
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires = 0.0
+
+    def _put(self, promotion: Promotion) -> None:
+        key = (promotion.scope, promotion.target_id)
+        self._targets.setdefault(key, {})[promotion.id] = _Rule(
+            promotion.id, promotion.discount_type, promotion.value, promotion.starts_at, promotion.ends_at
+        )
+        self._keys[promotion.id] = key
+
+    def _drop(self, promotion_id: int) -> None:
+        key = self._keys.pop(promotion_id, None)
+        if key is None:
+            return
+        rules = self._targets[key]
+        rules.pop(promotion_id, None)
+        if not rules:
+            del self._targets[key]
+
+    def put(self, promotion: Promotion) -> None:
+        """Add a new promotion or recompile an updated one"""
+        with self._lock:
+            self._drop(promotion.id)
+            if promotion.is_active:
+                self._put(promotion)
+
+    def remove(self, promotion_id: int) -> None:
+        with self._lock:
+            self._drop(promotion_id)
+
+    def best_prices(
+        self,
+        session: Session,
+        products: Iterable[Tuple[int, Optional[int], Optional[int], Optional[float]]],
+        at: Optional[datetime] = None
+    ) -> Dict[int, Tuple[float, int]]:
+        """
+        Best promotional price of each (id, category_id, provider_id, price).
+
+        Returns {product_id: (effective_price, promotion_id)} for the
+        products at least one live promotion applies to.
+        """
+        at = at or datetime.utcnow()
+        result: Dict[int, Tuple[float, int]] = {}
+        with self._lock:
+            if self._expires <= time.monotonic():
+                self.load(session)
+            if not self._targets:
+                return result
+            for product_id, category_id, provider_id, price in products:
+                if price is None:
+                    continue
+                best = None
+                for key in (
+                    (PromotionScope.product, product_id),
+                    (PromotionScope.category, category_id),
+                    (PromotionScope.provider, provider_id)
+                ):
+                    for rule in self._targets.get(key, {}).values():
+                        if rule.live(at):
+                            candidate = (rule.apply(price), rule.id)
+                            if best is None or candidate < best:
+                                best = candidate
+                if best is not None:
+                    result[product_id] = best
+        return result
+
+
+promotion_index = PromotionIndex()
+
+
+def apply_promotions(session: Session, products: List[ProductResponse]) -> None:
+    """Set effective_price/promotion_id on a page of products with one batch lookup"""
+    prices = promotion_index.best_prices(
+        session,
+        [(product.id, product.category_id, product.provider_id, product.price) for product in products]
+    )
+    for product in products:
+        product.effective_price, product.promotion_id = prices.get(product.id, (product.price, None))
@@ -0,0 +1,332 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import anyio
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from pydantic import ValidationError
+from sqlmodel import Session, select
+from starlette.config import Config
+
+import database
+from api import scrape_website
+from catalog_cache import catalog_cache
+from models.products import Product, ProductUpsertRow
+from models.providers import FeedSyncResult, Provider
+from product_bulk import CHUNK_SIZE, upsert_products
+from product_search import product_index
+
+config = Config(".env")
+
+FEED_SYNC_ENABLED = config("FEED_SYNC_ENABLED", cast=bool, default=True)
+# Scrapes run a headless browser each, so only a few at a time
+FEED_SYNC_CONCURRENCY = config("FEED_SYNC_CONCURRENCY", cast=int, default=2)
+FEED_SYNC_POLL_SECONDS = config("FEED_SYNC_POLL_SECONDS", cast=float, default=60.0)
+FEED_SCRAPE_WAIT_SECONDS = config("FEED_SCRAPE_WAIT_SECONDS", cast=int, default=5)
+# Advisory lock held by the one worker that runs scheduled syncs
+FEED_SCHEDULER_LOCK = config("FEED_SCHEDULER_LOCK", default="provider_feed_scheduler")
+
+FEED_FIELDS = ("sku", "name", "description", "price", "quantity")
+
+_number = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+class FeedSyncError(Exception):
+    """The provider's feed is not configured or could not be scraped"""
+
+
+class FeedSyncBusy(Exception):
+    """A sync of this provider is already running"""
+
+
+def feed_sku(provider_id: int, sku: str) -> str:
+    """Product SKU for a supplier SKU, prefixed so providers can't collide"""
+    return f"p{provider_id}-{sku}"[:64]
+
+
+def parse_price(text: Optional[str]) -> Optional[float]:
+    match = _number.search(text or "")
+    return float(match.group().replace(",", "")) if match else None
+
+
+def parse_quantity(text: Optional[str]) -> Optional[int]:
+    match = _number.search(text or "")
+    return int(float(match.group().replace(",", ""))) if match else None
+
+
+def _as_list(value) -> List[Optional[str]]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def feed_rows(provider_id: int, custom_data: Dict) -> Tuple[List[Dict], int]:
+    """
+    Turn scraped selector output into partial product rows.
+
+    Each selector yields one value per product on the page, so the n-th
+    values of all selectors describe the n-th product. Values that can't
+    be parsed, and fields whose extraction failed (None), are left out,
+    keeping the stored value. Returns the rows and the number of entries
+    skipped for lack of a sku.
+    """
+    columns = {
+        field: _as_list(custom_data[field]) for field in FEED_FIELDS if custom_data.get(field) is not None
+    }
+    rows, skipped = [], 0
+    for position in range(len(columns.get("sku", []))):
+        values = {field: (column[position] if position < len(column) else None) for field, column in columns.items()}
+        sku = (values.pop("sku") or "").strip()
+        if not sku:
+            skipped += 1
+            continue
+        row = {"sku": feed_sku(provider_id, sku)}
+        for field in ("name", "description"):
+            if (values.get(field) or "").strip():
+                row[field] = values[field].strip()
+        if parse_price(values.get("price")) is not None:
+            row["price"] = parse_price(values["price"])
+        if parse_quantity(values.get("quantity")) is not None:
+            row["quantity"] = parse_quantity(values["quantity"])
+        rows.append(row)
+    return rows, skipped
+
+
+def diff_feed(session: Session, provider_id: int, rows: List[Dict]) -> Tuple[List[Dict], int, int, List[str]]:
+    """
+    Compare feed rows with the stored products.
+
+    Returns the full upsert rows of new or changed products, the number of
+    unchanged products, the number of new entries skipped for lack of a
+    name, and errors for stored products that aren't valid upsert rows
+    (say, an empty name), which are left alone. Fields the feed doesn't
+    provide keep their stored values.
+    """
+    existing = {
+        product.sku: product
+        for product in session.exec(select(Product).where(Product.sku.in_([row["sku"] for row in rows]))).all()
+    }
+    changes, unchanged, skipped, errors = [], 0, 0, []
+    for row in rows:
+        current = existing.get(row["sku"])
+        if current is None:
+            if "name" not in row:
+                skipped += 1
+                continue
+            changes.append(ProductUpsertRow(**row, provider_id=provider_id).model_dump())
+            continue
+        try:
+            stored = ProductUpsertRow.model_validate(current.model_dump()).model_dump()
+        except ValidationError as e:
+            errors.append(f"Product {current.id} ({current.sku}): {e.errors()[0]['msg']}")
+            continue
+        merged = {**stored, **row}
+        if merged == stored:
+            unchanged += 1
+        else:
+            changes.append(merged)
+    return changes, unchanged, skipped, errors
+
+
+def _record_sync(provider_id: int, error: Optional[str] = None) -> None:
+    with Session(database.engine) as session:
+        provider = session.get(Provider, provider_id)
+        if provider:
+            provider.last_synced_at = datetime.utcnow()
+            provider.last_sync_error = error[:255] if error else None
+            session.add(provider)
+            session.commit()
+    catalog_cache.bump("providers")
+
+
+def sync_provider_feed(provider_id: int) -> FeedSyncResult:
+    """
+    Scrape a provider's feed page and apply the changes to its products.
+
+    Blocking (the scraper drives a browser), so run it in a worker thread.
+    Only new or changed products are written, in batched upserts.
+    """
+    with Session(database.engine) as session:
+        provider = session.get(Provider, provider_id)
+        if not provider or not provider.feed_url or "sku" not in (provider.feed_selectors or {}):
+            raise FeedSyncError("Provider has no feed_url or no sku selector configured")
+        url, selectors = provider.feed_url, dict(provider.feed_selectors)
+
+    # scrape_website is a coroutine but blocks on the browser throughout
+    scraped = asyncio.run(scrape_website(url, selectors, wait_time=FEED_SCRAPE_WAIT_SECONDS))
+    if "error" in scraped:
+        _record_sync(provider_id, scraped["error"])
+        raise FeedSyncError(scraped["error"])
+
+    # Fields whose selector failed are skipped, keeping the stored values; without skus there is nothing to sync
+    failed = scraped.get("custom_data_errors") or {}
+    if "sku" in failed:
+        error = f"Could not extract sku: {failed['sku']}"
+        _record_sync(provider_id, error)
+        raise FeedSyncError(error)
+    errors = [f"Could not extract {field}: {error}" for field, error in failed.items()]
+
+    rows, skipped = feed_rows(provider_id, scraped.get("custom_data") or {})
+    result = FeedSyncResult(message="Feed synced", provider_id=provider_id, scraped=len(rows) + skipped, skipped=skipped)
+    with Session(database.engine) as session:
+        for start in range(0, len(rows), CHUNK_SIZE):
+            changes, unchanged, missing_name, invalid = diff_feed(session, provider_id, rows[start:start + CHUNK_SIZE])
+            created, updated = upsert_products(session, changes)
+            result.created += created
+            result.updated += updated
+            result.unchanged += unchanged
+            result.skipped += missing_name + len(invalid)
+            errors += invalid
+        session.commit()
+    _record_sync(provider_id, "; ".join(errors) or None)
+
+    if result.created or result.updated:
+        product_index.invalidate()
+        catalog_cache.bump("products")
+    return result
+
+
+def due_provider_ids() -> List[int]:
+    """Providers with a scheduled feed whose interval has elapsed"""
+    now = datetime.utcnow()
+    with Session(database.engine) as session:
+        providers = session.exec(
+            select(Provider.id, Provider.feed_interval_minutes, Provider.last_synced_at)
+            .where(Provider.feed_url.is_not(None), Provider.feed_interval_minutes.is_not(None))
+        ).all()
+    return [
+        provider_id for provider_id, interval, last_synced_at in providers
+        if last_synced_at is None or last_synced_at + timedelta(minutes=interval) <= now
+    ]
+
+
+class SchedulerLock:
+    """
+    Elects one worker, across all processes sharing the database, to schedule syncs.
+
+    On MySQL the worker holding GET_LOCK keeps it on a dedicated connection;
+    the server releases it when that connection or process dies, and
+    another worker takes over on its next poll. Other databases (SQLite in
+    development) serve a single process, which always holds it. Blocking.
+    """
+
+    def __init__(self, name: str = FEED_SCHEDULER_LOCK):
+        self.name = name
+        self._connection: Optional[Connection] = None
+
+    def acquire(self) -> bool:
+        """Whether this worker holds the lock, taking it if it is free"""
+        if database.engine.dialect.name != "mysql":
+            return True
+        if self._connection is not None:
+            try:
+                held = self._query("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()")
+            except DBAPIError:
+                held = False
+            if held:
+                return True
+            self.release()
+        self._connection = database.engine.connect()
+        try:
+            if self._query("SELECT GET_LOCK(:name, 0)") == 1:
+                return True
+        except DBAPIError:
+            pass
+        self.release()
+        return False
+
+    def release(self) -> None:
+        if self._connection is None:
+            return
+        try:
+            self._query("SELECT RELEASE_LOCK(:name)")
+        except DBAPIError:
+            pass
+        self._connection.close()
+        self._connection = None
+
+    def _query(self, statement: str):
+        value = self._connection.execute(text(statement), {"name": self.name}).scalar()
+        # The lock belongs to the session, not the transaction; don't keep one open
+        self._connection.commit()
+        return value
+
+
+class FeedScheduler:
+    """
+    Runs due provider feed syncs in the background.
+
+    Only the worker holding the scheduler lock starts scheduled syncs, so
+    each due provider is scraped once however many workers run. At most
+    `concurrency` scrapes run at once per worker (manual syncs included),
+    each in a worker thread, and a provider is never synced twice
+    concurrently by one worker.
+    """
+
+    def __init__(self, concurrency: int = FEED_SYNC_CONCURRENCY, poll_seconds: float = FEED_SYNC_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._running: Set[int] = set()
+        self._lock = SchedulerLock()
+        self._task: Optional[asyncio.Task] = None
+        # Scheduled syncs, and the scrapes running in threads (which can't be interrupted)
+        self._syncs: Set[asyncio.Task] = set()
+        self._scrapes: Set[asyncio.Future] = set()
+
+    async def sync(self, provider_id: int) -> FeedSyncResult:
+        if provider_id in self._running:
+            raise FeedSyncBusy(f"Provider {provider_id} is already syncing")
+        self._running.add(provider_id)
+        try:
+            async with self._semaphore:
+                scrape = asyncio.ensure_future(anyio.to_thread.run_sync(sync_provider_feed, provider_id))
+                self._scrapes.add(scrape)
+                scrape.add_done_callback(self._scrapes.discard)
+                return await asyncio.shield(scrape)
+        finally:
+            self._running.discard(provider_id)
+
+    async def _sync_quietly(self, provider_id: int) -> None:
+        try:
+            await self.sync(provider_id)
+        except FeedSyncBusy:
+            pass
+        except Exception as e:
+            # Scrape failures are already recorded; this catches the rest
+            await anyio.to_thread.run_sync(_record_sync, provider_id, str(e))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await anyio.to_thread.run_sync(self._lock.acquire):
+                    for provider_id in await anyio.to_thread.run_sync(due_provider_ids):
+                        if provider_id not in self._running:
+                            task = asyncio.create_task(self._sync_quietly(provider_id))
+                            self._syncs.add(task)
+                            task.add_done_callback(self._syncs.discard)
+            except Exception:
+                # Database unavailable: try again on the next poll
+                pass
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self) -> None:
+        if FEED_SYNC_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop scheduling and cancel queued syncs, then wait for the scrapes already running"""
+        if self._task is None:
+            return
+        syncs = [self._task, *self._syncs]
+        for task in syncs:
+            task.cancel()
+        await asyncio.gather(*syncs, return_exceptions=True)
+        await asyncio.gather(*self._scrapes, return_exceptions=True)
+        self._task = None
+        await anyio.to_thread.run_sync(self._lock.release)
+
+
+feed_scheduler = FeedScheduler()
@@ -0,0 +1,40 @@
+from typing import FrozenSet, Optional
+
+from sqlmodel import Session, select
+from starlette.config import Config
+
+import database
+from loading_cache import LoadingCache
+from models.chats import ChatRoom, ChatRoomParticipant
+
+config = Config(".env")
+
+ROOM_MEMBERS_MAX_ROOMS = config("ROOM_MEMBERS_MAX_ROOMS", cast=int, default=10000)
+# Joins and leaves on another worker reach this one over the message bus; the
+# TTL only bounds staleness when the bus is unavailable
+ROOM_MEMBERS_TTL = config("ROOM_MEMBERS_TTL", cast=float, default=300.0)
+
+
+class RoomMembers(LoadingCache[int, FrozenSet[int]]):
+    """
+    Cache of chat room participants, loaded on demand.
+
+    Maps a room id to the frozen set of its members' user ids, or None if
+    the room doesn't exist. Join and leave call `invalidate`.
+    """
+
+    label = "rooms"
+
+    def __init__(self, max_rooms: int = ROOM_MEMBERS_MAX_ROOMS, ttl: float = ROOM_MEMBERS_TTL):
+        super().__init__(max_rooms, ttl)
+
+    def _load(self, room_id: int) -> Optional[FrozenSet[int]]:
+        with Session(database.engine) as session:
+            if session.get(ChatRoom, room_id) is None:
+                return None
+            return frozenset(session.exec(
+                select(ChatRoomParticipant.user_id).where(ChatRoomParticipant.chat_room_id == room_id)
+            ).all())
+
+
+room_members = RoomMembers()
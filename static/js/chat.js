@@ -48,6 +48,8 @@ function connectWebSocket() {
     chatWebSocket.onopen = function() {
         console.log('WebSocket connected');
         updateCurrentUserStatus(true);
+        // Subscriptions belong to the connection, so renew them after a reconnect
+        subscribePresence(usersList.map(user => user.id));
         if (window.chatPingInterval) {
             clearInterval(window.chatPingInterval);
         }
@@ -94,10 +96,21 @@ function handleWebSocketMessage(data) {
         case 'message_sent':
             break;
             
+        case 'unread_counts':
+            if (window.handleNotificationWebSocket) {
+                window.handleNotificationWebSocket(data);
+            }
+            break;
+            
         case 'user_status_update':
             updateUserOnlineStatus(data.user_id, data.is_online);
             break;
             
+        case 'presence_state':
+            data.online.forEach(userId => updateUserOnlineStatus(userId, true));
+            data.offline.forEach(userId => updateUserOnlineStatus(userId, false));
+            break;
+            
         case 'error':
             console.error('Chat error:', data.message);
             showNotification(data.message, 'error');
@@ -163,7 +176,7 @@ async function loadChatUsers() {
             usersList = await response.json();
             renderUsersList(usersList);
             
-            loadOnlineUsers();
+            subscribePresence(usersList.map(user => user.id));
         } else {
             console.error('Failed to load users');
             document.getElementById('chat-users-list').innerHTML = 
@@ -174,28 +187,11 @@ async function loadChatUsers() {
     }
 }
 
-async function loadOnlineUsers() {
-    try {
-        const token = localStorage.getItem('auth_token');
-        const response = await fetch('/api/v1/chat/users/online', {
-            headers: {
-                'Authorization': `Bearer ${token}`,
-                'Content-Type': 'application/json'
-            }
-        });
-        
-        if (response.ok) {
-            const onlineUsers = await response.json();
-            const onlineUserIds = new Set(onlineUsers.map(u => u.id));
-            
-            usersList.forEach(user => {
-                user.is_online = onlineUserIds.has(user.id);
-            });
-            
-            renderUsersList(usersList);
-        }
-    } catch (error) {
-        console.error('Error loading online users:', error);
+// Presence updates only arrive for users we subscribed to; the reply
+// carries their current status
+function subscribePresence(userIds) {
+    if (userIds.length && chatWebSocket && chatWebSocket.readyState === WebSocket.OPEN) {
+        chatWebSocket.send(JSON.stringify({ type: 'presence_subscribe', user_ids: userIds }));
     }
 }
 
@@ -15,8 +15,7 @@ document.addEventListener('DOMContentLoaded', function() {
 function initializeNotifications() {
     if (notificationsInitialized) return;
     
-    // Load initial unread count
-    loadUnreadCount();
+    // The unread count is pushed over the WebSocket on connect and on every change
     
     // Setup dropdown event listeners
     setupNotificationsDropdown();
@@ -86,10 +85,12 @@ function setupWebSocketNotifications() {
 }
 
 function handleNotificationWebSocket(data) {
-    if (data.type === 'notification') {
+    if (data.type === 'unread_counts') {
+        unreadCount = data.unread_count || 0;
+        updateNotificationBadge();
+    } else if (data.type === 'notification') {
         const notificationData = data.data;
         addNotificationToList(notificationData);
-        updateUnreadCount();
         
         // Show browser notification if page is not focused
         if (document.hidden && 'Notification' in window && Notification.permission === 'granted') {
@@ -121,7 +122,7 @@ async function loadNotifications() {
         });
         
         if (response.ok) {
-            notificationsList = await response.json();
+            notificationsList = (await response.json()).data;
             renderNotifications();
         } else {
             notificationsListEl.innerHTML = `
@@ -194,33 +195,6 @@ function addNotificationToList(notificationData) {
     if (dropdown && dropdown.classList.contains('show')) {
         renderNotifications();
     }
-    
-    updateUnreadCount();
-}
-
-async function loadUnreadCount() {
-    try {
-        const token = localStorage.getItem('auth_token');
-        const response = await fetch('/api/v1/chat/notifications/unread-count', {
-            headers: {
-                'Authorization': `Bearer ${token}`,
-                'Content-Type': 'application/json'
-            }
-        });
-        
-        if (response.ok) {
-            const data = await response.json();
-            unreadCount = data.unread_count || 0;
-            updateNotificationBadge();
-        }
-    } catch (error) {
-        console.error('Error loading unread count:', error);
-    }
-}
-
-function updateUnreadCount() {
-    unreadCount = notificationsList.filter(n => !n.is_read).length;
-    updateNotificationBadge();
 }
 
 function updateNotificationBadge() {
@@ -285,8 +259,6 @@ async function markNotificationRead(notificationId) {
                 const dot = notifItem.querySelector('.notification-dot');
                 if (dot) dot.remove();
             }
-            
-            updateUnreadCount();
         }
     } catch (error) {
         console.error('Error marking notification as read:', error);
@@ -312,7 +284,6 @@ async function markAllNotificationsRead() {
             
             // Update UI
             renderNotifications();
-            updateUnreadCount();
         }
     } catch (error) {
         console.error('Error marking all notifications as read:', error);
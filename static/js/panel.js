@@ -116,11 +116,34 @@ async function loadDashboardData() {
         } else {
             console.error('Failed to load images:', imagesResponse.status);
         }
+
+        await loadCatalogAnalytics();
     } catch (error) {
         console.error('Error loading dashboard data:', error);
     }
 }
 
+async function loadCatalogAnalytics() {
+    const response = await fetch('/api/v1/analytics/catalog', {
+        headers: getAuthHeaders()
+    });
+
+    if (handleApiError(response)) return;
+
+    // Only admins can see analytics; other users keep the placeholders
+    if (!response.ok) {
+        console.error('Failed to load analytics:', response.status);
+        return;
+    }
+
+    const analytics = await response.json();
+    const money = value => Number(value || 0).toLocaleString(undefined, { maximumFractionDigits: 2 });
+    document.getElementById('total-products').textContent = analytics.product_count || 0;
+    document.getElementById('stock-value').textContent = money(analytics.stock_value);
+    document.getElementById('total-revenue').textContent = money(analytics.revenue_total);
+    document.getElementById('low-stock-count').textContent = analytics.low_stock_count || 0;
+}
+
 function loadSectionData(section) {
     switch(section) {
         case 'users':
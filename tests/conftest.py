@@ -0,0 +1,24 @@
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+import database
+# Register every table before create_all
+from models import analytics, categories, chats, idempotency, images, orders, products, promotion, providers, reports, users  # noqa: F401
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """A fresh SQLite database file in place of the configured MySQL one"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlmodel import Session
+
+from inventory import reserve_stock, reserve_stock_bulk
+from models.products import Product
+
+WORKERS = 16
+
+
+def _reserve_concurrently(engine, reserve, stock):
+    """Run `reserve(session)` from WORKERS threads at once, each in its own transaction"""
+    with Session(engine) as session:
+        product = Product(name="Hot", price=1.0, quantity=stock)
+        session.add(product)
+        session.commit()
+        product_id = product.id
+    barrier = threading.Barrier(WORKERS)
+
+    def worker(_):
+        with Session(engine) as session:
+            barrier.wait()
+            reserved = reserve(session, product_id)
+            session.commit()
+            return reserved
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(worker, range(WORKERS)))
+    with Session(engine) as session:
+        return results.count(True), session.get(Product, product_id).quantity
+
+
+def test_concurrent_reservations_never_oversell(engine):
+    successes, remaining = _reserve_concurrently(
+        engine, lambda session, product_id: reserve_stock(session, product_id, 1), 5
+    )
+    assert (successes, remaining) == (5, 0)
+
+
+def test_concurrent_bulk_reservations_never_oversell(engine):
+    successes, remaining = _reserve_concurrently(
+        engine, lambda session, product_id: reserve_stock_bulk(session, {product_id: 2}), 6
+    )
+    assert (successes, remaining) == (3, 0)
+
+
+def test_untracked_stock_is_never_short(session):
+    product = Product(name="Service", price=1.0, quantity=None)
+    session.add(product)
+    session.commit()
+    assert reserve_stock(session, product.id, 1000)
+    session.commit()
+    session.refresh(product)
+    assert product.quantity is None
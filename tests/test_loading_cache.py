@@ -0,0 +1,54 @@
+from loading_cache import LoadingCache
+
+
+class _Cache(LoadingCache[int, dict]):
+    def __init__(self):
+        super().__init__(max_entries=2, ttl=60)
+        self.source = {}
+        self.during_load = None
+
+    def _load(self, key):
+        value = self.source.get(key)
+        if self.during_load:
+            self.during_load()
+        return None if value is None else dict(value)
+
+    def _copy(self, value):
+        return dict(value)
+
+
+def test_loads_once_and_evicts_least_recently_used():
+    cache = _Cache()
+    cache.source = {1: {"v": 1}, 2: {"v": 2}, 3: {"v": 3}}
+    assert cache.get(1) == {"v": 1}
+    assert cache.get(1) == {"v": 1}
+    cache.get(2)
+    cache.get(3)
+    assert cache.peek(1) is None and cache.peek(3) == {"v": 3}
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 2, "misses": 3}
+
+
+def test_missing_values_are_not_cached():
+    cache = _Cache()
+    assert cache.get(1) is None
+    assert cache.peek(1) is None and cache.stats()["entries"] == 0
+
+
+def test_load_racing_with_invalidate_is_not_stored():
+    cache = _Cache()
+    cache.source = {1: {"v": 1}}
+    cache.during_load = lambda: cache.invalidate(1)
+    assert cache.get(1) == {"v": 1}
+    assert cache.peek(1) is None
+    cache.during_load = None
+    cache.get(1)
+    assert cache.peek(1) == {"v": 1}
+    assert cache._loading == {}
+
+
+def test_callers_get_copies():
+    cache = _Cache()
+    cache.source = {1: {"v": 1}}
+    cache.get(1)["v"] = 99
+    cache.peek(1)["v"] = 99
+    assert cache.peek(1) == {"v": 1}
@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from models.products import Product
+from models.users import UserNotification
+from pagination import decode_cursor, encode_cursor
+
+FEED_ORDER = [(UserNotification.created_at, True), (UserNotification.id, True)]
+PRICE_ORDER = [(Product.price, False), (Product.id, False)]
+NAME_ORDER = [(Product.name, False), (Product.id, False)]
+
+
+def _forge(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_round_trip_restores_column_types():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    assert decode_cursor(encode_cursor([created_at, 7]), FEED_ORDER) == [created_at, 7]
+    assert decode_cursor(encode_cursor([10, 3]), PRICE_ORDER) == [10.0, 3]
+    assert decode_cursor(encode_cursor(["Widget", 3]), NAME_ORDER) == ["Widget", 3]
+
+
+@pytest.mark.parametrize("cursor, order", [
+    ("not base64!", FEED_ORDER),
+    (_forge({"created_at": "2026-01-01"}), FEED_ORDER),
+    (_forge(["2026-01-01T00:00:00"]), FEED_ORDER),
+    (_forge(["yesterday", 7]), FEED_ORDER),
+    (_forge([20260101, 7]), FEED_ORDER),
+    (_forge(["2026-01-01T00:00:00", "7"]), FEED_ORDER),
+    (_forge(["2026-01-01T00:00:00", True]), FEED_ORDER),
+    (_forge([None, 3]), PRICE_ORDER),
+    (_forge([["a"], 3]), NAME_ORDER),
+])
+def test_invalid_cursor_is_a_400(cursor, order):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, order)
+    assert (error.value.status_code, error.value.detail) == (400, "Invalid cursor")
@@ -0,0 +1,54 @@
+from sqlmodel import select
+
+from models.categories import Category
+from models.products import Product
+from models.providers import Provider
+from product_bulk import FeedFormat, run_bulk_upsert
+
+
+def _stored(session, sku):
+    session.expire_all()
+    return session.exec(select(Product).where(Product.sku == sku)).one()
+
+
+def _seed(session):
+    session.add(Category(id=1, name="Tools"))
+    session.add(Provider(id=1, name="Acme"))
+    session.add(Product(sku="A1", name="Alpha", price=9.5, quantity=3, is_active=False, category_id=1, provider_id=1))
+    session.commit()
+
+
+def test_partial_ndjson_row_keeps_stored_fields(session):
+    _seed(session)
+    result = run_bulk_upsert(['{"sku": "A1", "name": "Alpha2"}\n'], FeedFormat.ndjson)
+    assert (result.created, result.updated, result.failed) == (0, 1, 0)
+    product = _stored(session, "A1")
+    assert product.name == "Alpha2"
+    assert (product.price, product.quantity, product.is_active) == (9.5, 3, False)
+    assert (product.category_id, product.provider_id) == (1, 1)
+
+
+def test_empty_csv_cells_keep_stored_fields(session):
+    _seed(session)
+    lines = ["sku,name,price,quantity,category_id,provider_id\n", "A1,Alpha2,,7,,\n"]
+    result = run_bulk_upsert(lines, FeedFormat.csv)
+    assert (result.updated, result.failed) == (1, 0)
+    product = _stored(session, "A1")
+    assert (product.name, product.price, product.quantity) == ("Alpha2", 9.5, 7)
+    assert (product.category_id, product.provider_id) == (1, 1)
+
+
+def test_explicit_null_clears_a_field(session):
+    _seed(session)
+    run_bulk_upsert(['{"sku": "A1", "name": "Alpha", "price": null}\n'], FeedFormat.ndjson)
+    assert _stored(session, "A1").price is None
+
+
+def test_new_rows_get_defaults_alongside_partial_updates(session):
+    _seed(session)
+    lines = ['{"sku": "B1", "name": "Beta", "price": 2}\n', '{"sku": "A1", "name": "Alpha", "quantity": 1}\n']
+    result = run_bulk_upsert(lines, FeedFormat.ndjson)
+    assert (result.created, result.updated) == (1, 1)
+    new = _stored(session, "B1")
+    assert (new.price, new.quantity, new.is_active, new.category_id) == (2, None, True, None)
+    assert (_stored(session, "A1").price, _stored(session, "A1").quantity) == (9.5, 1)
@@ -0,0 +1,189 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from starlette.config import Config
+
+import database
+from database import upsert_statement
+from loading_cache import LoadingCache
+from models.chats import Chat
+from models.users import UnreadCounter, UserNotification
+
+config = Config(".env")
+
+UNREAD_CACHE_MAX_USERS = config("UNREAD_CACHE_MAX_USERS", cast=int, default=50000)
+# Other workers' writes arrive as bus invalidations; the TTL covers a lost one
+UNREAD_CACHE_TTL = config("UNREAD_CACHE_TTL", cast=float, default=300.0)
+
+TOTAL_KEY = ""
+CHUNK_SIZE = 1000
+
+# (user id, conversation key) -> change in unread notifications
+UnreadDeltas = Dict[Tuple[int, str], int]
+
+
+def notification_deltas(user_id: int, conversation_key: Optional[str] = None, sign: int = 1) -> UnreadDeltas:
+    """Counter changes for one notification arriving (or, with sign=-1, being read)"""
+    deltas = {(user_id, TOTAL_KEY): sign}
+    if conversation_key:
+        deltas[(user_id, conversation_key)] = sign
+    return deltas
+
+
+def merge_deltas(*all_deltas: UnreadDeltas) -> UnreadDeltas:
+    merged: UnreadDeltas = {}
+    for deltas in all_deltas:
+        for key, change in deltas.items():
+            merged[key] = merged.get(key, 0) + change
+    return merged
+
+
+def apply_unread_deltas(session: Session, deltas: UnreadDeltas) -> None:
+    """
+    Apply counter changes in the caller's transaction.
+
+    Increments are one multi-row upsert; decrements update existing rows
+    and never go below zero. Call `unread_counters.apply` after the commit.
+    """
+    increments = [
+        {"user_id": user_id, "conversation_key": key, "count": change}
+        for (user_id, key), change in deltas.items() if change > 0
+    ]
+    if increments:
+        session.exec(upsert_statement(
+            session, UnreadCounter, increments, ["user_id", "conversation_key"], increment_columns=["count"]
+        ))
+    table = UnreadCounter.__table__
+    for (user_id, key), change in deltas.items():
+        if change < 0:
+            session.exec(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.conversation_key == key)
+                .values(count=case((table.c.count > -change, table.c.count + change), else_=0))
+            )
+
+
+def clear_unread(session: Session, user_id: int) -> None:
+    """Zero all of a user's counters in the caller's transaction"""
+    session.exec(delete(UnreadCounter).where(UnreadCounter.user_id == user_id))
+
+
+def load_unread(session: Session, user_id: int) -> Dict[str, int]:
+    return dict(session.exec(
+        select(UnreadCounter.conversation_key, UnreadCounter.count)
+        .where(UnreadCounter.user_id == user_id, UnreadCounter.count > 0)
+    ).all())
+
+
+def unread_payload(counts: Dict[str, int]) -> Dict[str, Any]:
+    """Counts as sent to clients"""
+    return {
+        "unread_count": counts.get(TOTAL_KEY, 0),
+        "conversations": {key: count for key, count in counts.items() if key != TOTAL_KEY and count > 0},
+    }
+
+
+class UnreadCounters(LoadingCache[int, Dict[str, int]]):
+    """
+    Per-user unread counts served from memory.
+
+    Misses load the user's counter rows; writers apply their committed
+    deltas to cached users, and `invalidate` drops users changed elsewhere.
+    Applying deltas or a reset also keeps a racing load from being stored.
+    """
+
+    label = "users"
+
+    def __init__(self, max_users: int = UNREAD_CACHE_MAX_USERS, ttl: float = UNREAD_CACHE_TTL):
+        super().__init__(max_users, ttl)
+
+    def _load(self, user_id: int) -> Dict[str, int]:
+        with Session(database.engine) as session:
+            return load_unread(session, user_id)
+
+    def _copy(self, counts: Dict[str, int]) -> Dict[str, int]:
+        # Cached counts are updated in place by apply
+        return dict(counts)
+
+    def apply(self, deltas: UnreadDeltas) -> None:
+        """Reflect committed deltas in the cached counts"""
+        with self._lock:
+            for (user_id, key), change in deltas.items():
+                self._cancel_loads(user_id)
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    entry[0][key] = max(entry[0].get(key, 0) + change, 0)
+
+    def reset(self, user_id: int) -> None:
+        """The user's counters were cleared"""
+        with self._lock:
+            self._cancel_loads(user_id)
+            if user_id in self._entries:
+                self._entries[user_id] = ({}, self._entries[user_id][1])
+
+
+unread_counters = UnreadCounters()
+
+
+def _unread_rows(session: Session, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Counter rows computed from the notifications, for one user or everyone"""
+    unread = [UserNotification.is_read == False, UserNotification.is_archived == False]
+    if user_id is not None:
+        unread.append(UserNotification.user_id == user_id)
+    totals = (
+        select(UserNotification.user_id, func.count())
+        .where(*unread)
+        .group_by(UserNotification.user_id)
+    )
+    conversations = (
+        select(UserNotification.user_id, Chat.conversation_key, func.count())
+        .join(Chat, Chat.id == UserNotification.related_chat_id)
+        .where(*unread, Chat.conversation_key.is_not(None))
+        .group_by(UserNotification.user_id, Chat.conversation_key)
+    )
+    return [
+        {"user_id": user_id, "conversation_key": TOTAL_KEY, "count": count}
+        for user_id, count in session.exec(totals).all()
+    ] + [
+        {"user_id": user_id, "conversation_key": key, "count": count}
+        for user_id, key, count in session.exec(conversations).all()
+    ]
+
+
+def recount_unread(session: Session, user_id: int) -> None:
+    """
+    Recompute a user's counters from their notifications in the caller's transaction.
+
+    For bulk changes, where counting what each statement touched would cost
+    as much as recounting.
+    """
+    clear_unread(session, user_id)
+    rows = _unread_rows(session, user_id)
+    if rows:
+        session.exec(insert(UnreadCounter.__table__).values(rows))
+
+
+def rebuild_unread_counters() -> bool:
+    """
+    Fill the counters from the notifications if there are none yet.
+
+    For databases that had notifications before the counters existed.
+    Returns whether it rebuilt them.
+    """
+    with Session(database.engine) as session:
+        if session.exec(select(UnreadCounter.user_id).limit(1)).first() is not None:
+            return False
+        rows = _unread_rows(session)
+        if not rows:
+            return False
+        try:
+            for start in range(0, len(rows), CHUNK_SIZE):
+                session.exec(insert(UnreadCounter.__table__).values(rows[start:start + CHUNK_SIZE]))
+            session.commit()
+        except IntegrityError:
+            # Another worker rebuilt them first
+            session.rollback()
+            return False
+    return True
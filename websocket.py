@@ -1,117 +1,444 @@
+import asyncio
 import json
+import time
+import uuid
+from collections import deque
 from fastapi import WebSocket, APIRouter, WebSocketDisconnect, Query
 from fastapi import status
-from typing import Dict, Optional
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
+from starlette.config import Config
 
 from auth.jwt import verify_access_token
 from models.users import User
-from models.chats import Chat, ChatType
-from models.users import UserNotification
-from database import engine
+import database
+from chat_store import (
+    CHAT_ACK_MODE, chat_recipients, chat_row, chat_writer, load_room_members, load_unread_counts,
+    persist_chat_message, run_chat_db, set_user_online
+)
+from room_members import room_members
+from unread_counters import unread_counters, unread_payload
+from message_bus import BROADCAST_CHANNEL, PRESENCE_CHANNEL, create_bus, worker_channel
 from sqlmodel import Session, select
 
 
+config = Config(".env")
+
+# Outbound messages buffered per connection before the overflow policy kicks in
+WS_SEND_QUEUE_SIZE = config("WS_SEND_QUEUE_SIZE", cast=int, default=256)
+# "disconnect" closes a connection whose queue is full, "drop" discards the message
+WS_OVERFLOW_POLICY = config("WS_OVERFLOW_POLICY", default="disconnect")
+WS_LATENCY_SAMPLES = 1000
+# Workers publish their connected users this often; a worker missing for
+# PRESENCE_TTL_SECONDS is presumed gone along with its users
+PRESENCE_HEARTBEAT_SECONDS = config("PRESENCE_HEARTBEAT_SECONDS", cast=float, default=10.0)
+PRESENCE_TTL_SECONDS = config("PRESENCE_TTL_SECONDS", cast=float, default=30.0)
+# A status change is announced once it has held this long, so flapping connections stay quiet
+PRESENCE_DEBOUNCE_SECONDS = config("PRESENCE_DEBOUNCE_SECONDS", cast=float, default=2.0)
+PRESENCE_MAX_WATCHED = config("PRESENCE_MAX_WATCHED", cast=int, default=1000)
+
+
+class Connection:
+    """One WebSocket with its bounded send queue, drained by its own writer task"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[tuple[str, float]]" = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.evicting = False
+        # Users whose presence this client subscribed to
+        self.watching: Set[int] = set()
+
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Dict[int, list[WebSocket]] = {}
-        self.websocket_to_user: Dict[WebSocket, int] = {}
+    """
+    Tracks connections per user and fans messages out to them.
+
+    Sending never awaits network I/O: the message is serialized once and
+    put on every target connection's queue, and each connection's writer
+    task delivers at its own pace, so a slow client only delays itself.
+    A connection whose queue is full is closed (or, with the "drop"
+    policy, misses the message).
+
+    With several workers, a message bus (see message_bus.py) carries
+    broadcasts to every worker and user messages to the workers holding
+    that user's connections. Each worker announces its users on connect,
+    disconnect and every heartbeat, giving all workers the cluster-wide
+    presence.
+
+    Status changes only go to connections that subscribed to the user
+    (presence_subscribe), and only once the new status has held for
+    PRESENCE_DEBOUNCE_SECONDS. Each worker derives changes from the
+    presence it tracks, so statuses aren't broadcast over the bus.
+    """
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, overflow_policy: str = WS_OVERFLOW_POLICY):
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.active_connections: Dict[int, list[Connection]] = {}
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.send_errors = 0
+        # Seconds from enqueue to send_text completing, most recent first out
+        self.latencies: Deque[float] = deque(maxlen=WS_LATENCY_SAMPLES)
+        self.worker_id = uuid.uuid4().hex
+        self.bus = None
+        self.bus_errors = 0
+        # Users connected to other workers: worker id -> (user ids, expiry)
+        self.remote_users: Dict[str, Tuple[Set[int], float]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Watched user -> connections subscribed to them, and the status they were last told
+        self.watchers: Dict[int, Set[Connection]] = {}
+        self.announced: Dict[int, bool] = {}
+        self._pending_presence: Dict[int, asyncio.TimerHandle] = {}
+        self.presence_sent = 0
+
+    async def start(self, bus=None):
+        """Join the message bus and start announcing presence"""
+        self.bus = bus or create_bus()
+        await self.bus.subscribe([BROADCAST_CHANNEL, PRESENCE_CHANNEL, worker_channel(self.worker_id)], self._on_bus_message)
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self.bus is not None:
+            await self._publish(PRESENCE_CHANNEL, {"kind": "presence_gone"})
+            await self.bus.close()
+            self.bus = None
+
+    async def _publish(self, channel: str, payload: dict):
+        if self.bus is None:
+            return
+        try:
+            await self.bus.publish(channel, {"origin": self.worker_id, **payload})
+        except Exception:
+            self.bus_errors += 1
+
+    async def _on_bus_message(self, envelope: dict):
+        origin = envelope.get("origin")
+        if origin == self.worker_id:
+            return
+        kind = envelope.get("kind")
+        if kind == "deliver":
+            self._deliver_local(envelope["user_id"], envelope["message"])
+        elif kind == "broadcast":
+            self._broadcast_local(envelope["message"])
+        elif kind == "presence":
+            users = set(envelope["users"])
+            previous, _ = self.remote_users.get(origin, (set(), 0.0))
+            self.remote_users[origin] = (users, time.monotonic() + PRESENCE_TTL_SECONDS)
+            for user_id in users ^ previous:
+                self._presence_changed(user_id)
+        elif kind == "presence_delta":
+            users, expires = self.remote_users.get(origin, (set(), time.monotonic() + PRESENCE_TTL_SECONDS))
+            if envelope["online"]:
+                users.add(envelope["user_id"])
+            else:
+                users.discard(envelope["user_id"])
+            self.remote_users[origin] = (users, expires)
+            self._presence_changed(envelope["user_id"])
+        elif kind == "presence_gone":
+            self._forget_worker(origin)
+        elif kind == "room_members":
+            room_members.invalidate(envelope["room_id"])
+        elif kind == "unread":
+            unread_counters.invalidate(*envelope["user_ids"])
+
+    def _forget_worker(self, worker_id: str):
+        """Drop a worker's users, telling watchers about those now offline"""
+        users, _ = self.remote_users.pop(worker_id, (set(), 0.0))
+        for user_id in users:
+            self._presence_changed(user_id)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await self._publish(PRESENCE_CHANNEL, {"kind": "presence", "users": list(self.active_connections)})
+            # Workers that stopped heartbeating took their connections with them
+            now = time.monotonic()
+            for worker_id, (_, expires) in list(self.remote_users.items()):
+                if expires <= now:
+                    self._forget_worker(worker_id)
+            await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+
+    def _remote_workers_for(self, user_id: int) -> list[str]:
+        now = time.monotonic()
+        return [worker_id for worker_id, (users, expires) in list(self.remote_users.items()) if user_id in users and expires > now]
+
+    def online_user_ids(self) -> Set[int]:
+        """Users with a connection on any worker"""
+        now = time.monotonic()
+        online = set(self.active_connections)
+        for users, expires in list(self.remote_users.values()):
+            if expires > now:
+                online |= users
+        return online
 
     async def connect(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
-        was_offline = user_id not in self.active_connections or len(self.active_connections.get(user_id, [])) == 0
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-        self.websocket_to_user[websocket] = user_id
-        
-        # Broadcast online status if user just came online
-        if was_offline:
-            await self.broadcast_online_status(user_id, True)
+        first_local = user_id not in self.active_connections
+        connection = Connection(websocket, user_id, self.queue_size)
+        connection.writer = asyncio.create_task(self._write(connection))
+        self.active_connections.setdefault(user_id, []).append(connection)
+        self.connections[websocket] = connection
+        if first_local:
+            await self._publish(PRESENCE_CHANNEL, {"kind": "presence_delta", "user_id": user_id, "online": True})
+            self._presence_changed(user_id)
+
+    def _remove(self, connection: Connection) -> bool:
+        """Forget a connection and stop its writer; True if its user has no connections left"""
+        if self.connections.pop(connection.websocket, None) is None:
+            return False
+        self._unwatch(connection, connection.watching)
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        connections = self.active_connections.get(connection.user_id, [])
+        if connection in connections:
+            connections.remove(connection)
+        if connections:
+            return False
+        self.active_connections.pop(connection.user_id, None)
+        return True
+
+    async def _left(self, user_id: int):
+        """The user's last connection on this worker is gone"""
+        await self._publish(PRESENCE_CHANNEL, {"kind": "presence_delta", "user_id": user_id, "online": False})
+        self._presence_changed(user_id)
 
     async def disconnect(self, websocket: WebSocket):
-        user_id = self.websocket_to_user.get(websocket)
-        if user_id:
-            if user_id in self.active_connections:
-                if websocket in self.active_connections[user_id]:
-                    self.active_connections[user_id].remove(websocket)
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
-                    # Broadcast offline status
-                    await self.broadcast_online_status(user_id, False)
-            del self.websocket_to_user[websocket]
+        connection = self.connections.get(websocket)
+        if connection and self._remove(connection):
+            await self._left(connection.user_id)
+
+    async def _write(self, connection: Connection):
+        while True:
+            message_json, enqueued_at = await connection.queue.get()
+            try:
+                await connection.websocket.send_text(message_json)
+            except Exception:
+                self.send_errors += 1
+                await self.disconnect(connection.websocket)
+                return
+            self.sent += 1
+            self.latencies.append(time.monotonic() - enqueued_at)
+
+    async def _evict(self, connection: Connection):
+        if self._remove(connection):
+            await self._left(connection.user_id)
+        try:
+            await connection.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow to receive messages")
+        except Exception:
+            pass
+
+    def _enqueue(self, connection: Connection, message_json: str, enqueued_at: float):
+        if connection.evicting:
+            return
+        try:
+            connection.queue.put_nowait((message_json, enqueued_at))
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            if self.overflow_policy == "drop":
+                connection.dropped += 1
+                self.dropped += 1
+            else:
+                connection.evicting = True
+                self.evicted += 1
+                asyncio.create_task(self._evict(connection))
+
+    def _deliver_local(self, user_id: int, message_json: str):
+        now = time.monotonic()
+        for connection in list(self.active_connections.get(user_id, [])):
+            self._enqueue(connection, message_json, now)
+
+    def _broadcast_local(self, message_json: str):
+        now = time.monotonic()
+        for connection in list(self.connections.values()):
+            self._enqueue(connection, message_json, now)
 
     async def send_to_user(self, user_id: int, message: dict):
-        """Send message to a specific user (all their connections)"""
-        if user_id in self.active_connections:
-            message_json = json.dumps(message, default=str)
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message_json)
-                except Exception:
-                    await self.disconnect(connection)
+        """Send message to a specific user (all their connections, on any worker)"""
+        local = user_id in self.active_connections
+        remote = self._remote_workers_for(user_id)
+        if not local and not remote:
+            return
+        message_json = json.dumps(message, default=str)
+        self._deliver_local(user_id, message_json)
+        for worker_id in remote:
+            await self._publish(worker_channel(worker_id), {"kind": "deliver", "user_id": user_id, "message": message_json})
+
+    def send_to_connection(self, connection: Connection, message: dict):
+        """Send message to one connection only (e.g. a reply to that client)"""
+        self._enqueue(connection, json.dumps(message, default=str), time.monotonic())
 
     async def broadcast(self, message: dict):
         """Broadcast message to all connected users"""
         message_json = json.dumps(message, default=str)
-        for user_id, connections in list(self.active_connections.items()):
-            for connection in connections[:]: 
-                try:
-                    await connection.send_text(message_json)
-                except Exception:
-                    await self.disconnect(connection)
-
-    async def send_chat_notification(self, chat: Chat):
-        """Send chat notification to receiver and create notification record"""
-        notification_data = {
-            "type": "chat_message",
-            "chat_id": chat.id,
-            "sender_id": chat.sender_id,
-            "message": chat.message,
-            "created_at": chat.created_at.isoformat() if chat.created_at else None,
+        self._broadcast_local(message_json)
+        await self._publish(BROADCAST_CHANNEL, {"kind": "broadcast", "message": message_json})
+
+    def stats(self) -> dict:
+        depths = [connection.queue.qsize() for connection in self.connections.values()]
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 3)
+
+        return {
+            "users": len(self.active_connections),
+            "connections": len(self.connections),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "send_errors": self.send_errors,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p99": percentile(0.99),
+            "worker_id": self.worker_id,
+            "bus": type(self.bus).__name__ if self.bus else None,
+            "bus_errors": self.bus_errors,
+            "remote_workers": len(self.remote_users),
+            "cluster_users": len(self.online_user_ids()),
+            "watched_users": len(self.watchers),
+            "presence_pending": len(self._pending_presence),
+            "presence_sent": self.presence_sent,
         }
-        
-        if chat.receiver_id:
-            await self.send_to_user(chat.receiver_id, {
-                "type": "notification",
-                "data": notification_data
-            })
-            
-            with Session(engine) as session:
-                notification = UserNotification(
-                    user_id=chat.receiver_id,
-                    title="New Message",
-                    message=chat.message[:100],  
-                    notification_type="chat",
-                    related_chat_id=chat.id,
-                    is_read=False
-                )
-                session.add(notification)
-                session.commit()
-
-        if chat.sender_id:
-            await self.send_to_user(chat.sender_id, {
+
+    async def send_chat_notification(self, chat: Dict, client_id: Optional[str] = None,
+                                     room_member_ids: Iterable[int] = (), notified_ids: Iterable[int] = ()):
+        """
+        Deliver a stored message (see chat_store.chat_payload) to its receiver
+        (or the room members) and sender.
+
+        The sender's copy echoes `client_id`, which lets a client match the
+        stored id to a message it sent. `notified_ids` are the room members
+        that got a notification.
+        """
+        recipients = [chat["receiver_id"]] if chat["receiver_id"] else room_member_ids
+        notification = {"type": "notification", "data": chat}
+        for user_id in recipients:
+            if user_id != chat["sender_id"]:
+                await self.send_to_user(user_id, notification)
+
+        if chat["sender_id"]:
+            await self.send_to_user(chat["sender_id"], {
                 "type": "message_sent",
-                "data": notification_data
+                "client_id": client_id,
+                "data": chat
             })
 
+        await self.unread_changed(chat_recipients(chat["receiver_id"], notified_ids))
+
+    async def unread_changed(self, user_ids: Iterable[int]):
+        """
+        Users' unread counters changed (and were applied to this worker's cache).
+
+        Other workers drop their cached counts, and users that are online get
+        the new counts pushed.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        await self._publish(BROADCAST_CHANNEL, {"kind": "unread", "user_ids": user_ids})
+        for user_id in user_ids:
+            if self.is_user_online(user_id):
+                await self.send_unread_counts(user_id)
+
+    async def send_unread_counts(self, user_id: int):
+        counts = await load_unread_counts(user_id)
+        await self.send_to_user(user_id, {"type": "unread_counts", **unread_payload(counts)})
+
+    async def invalidate_room(self, room_id: int):
+        """Drop a room's cached members here and on the other workers"""
+        room_members.invalidate(room_id)
+        await self._publish(BROADCAST_CHANNEL, {"kind": "room_members", "room_id": room_id})
+
     def is_user_online(self, user_id: int) -> bool:
-        return user_id in self.active_connections and len(self.active_connections[user_id]) > 0
-    
-    async def broadcast_online_status(self, user_id: int, is_online: bool):
-        """Broadcast user online/offline status to all connected users"""
-        await self.broadcast({
+        """Whether the user is connected to this or any other worker"""
+        return user_id in self.active_connections or bool(self._remote_workers_for(user_id))
+
+    @staticmethod
+    def _status_message(user_id: int, is_online: bool) -> dict:
+        return {
             "type": "user_status_update",
             "user_id": user_id,
             "is_online": is_online
-        })
+        }
+    
+    def watch(self, connection: Connection, user_ids: Iterable[int]) -> dict:
+        """Subscribe a connection to users' presence; returns their current status"""
+        added = [
+            user_id for user_id in dict.fromkeys(user_ids)
+            if isinstance(user_id, int) and user_id not in connection.watching
+        ][:max(PRESENCE_MAX_WATCHED - len(connection.watching), 0)]
+        for user_id in added:
+            connection.watching.add(user_id)
+            if user_id not in self.watchers:
+                self.watchers[user_id] = set()
+                self.announced[user_id] = self.is_user_online(user_id)
+            self.watchers[user_id].add(connection)
+        return {
+            "type": "presence_state",
+            "online": [user_id for user_id in added if self.is_user_online(user_id)],
+            "offline": [user_id for user_id in added if not self.is_user_online(user_id)],
+        }
+
+    def _unwatch(self, connection: Connection, user_ids: Iterable[int]):
+        for user_id in list(user_ids):
+            connection.watching.discard(user_id)
+            watchers = self.watchers.get(user_id)
+            if watchers is None:
+                continue
+            watchers.discard(connection)
+            if not watchers:
+                del self.watchers[user_id]
+                self.announced.pop(user_id, None)
+                pending = self._pending_presence.pop(user_id, None)
+                if pending is not None:
+                    pending.cancel()
+
+    def unwatch(self, connection: Connection, user_ids: Optional[Iterable[int]] = None):
+        """Unsubscribe from some users' presence, or from everyone's"""
+        self._unwatch(connection, connection.watching if user_ids is None else user_ids)
+
+    def _presence_changed(self, user_id: int):
+        """Schedule an announcement of the user's status to their watchers"""
+        if user_id in self.watchers and user_id not in self._pending_presence:
+            self._pending_presence[user_id] = asyncio.get_running_loop().call_later(
+                PRESENCE_DEBOUNCE_SECONDS, self._settle_presence, user_id
+            )
+
+    def _settle_presence(self, user_id: int):
+        self._pending_presence.pop(user_id, None)
+        watchers = self.watchers.get(user_id)
+        is_online = self.is_user_online(user_id)
+        # Back where it was (a reconnect within the window): nothing to say
+        if not watchers or self.announced.get(user_id) == is_online:
+            return
+        self.announced[user_id] = is_online
+        message_json = json.dumps(self._status_message(user_id, is_online))
+        now = time.monotonic()
+        for connection in list(watchers):
+            self._enqueue(connection, message_json, now)
+        self.presence_sent += len(watchers)
 
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
 manager = WebSocketManager()
 
 
-async def get_user_from_token(token: str, session: Session) -> Optional[User]:
+def get_user_from_token(token: str, session: Session) -> Optional[User]:
     try:
         payload = verify_access_token(token)
         email: str = payload.get("sub")
@@ -125,94 +452,153 @@ async def get_user_from_token(token: str, session: Session) -> Optional[User]:
         return None
 
 
-@router.websocket("/chat")
-async def websocket_chat_endpoint(
-    websocket: WebSocket,
-    token: str = Query(...)
-):
-    """WebSocket endpoint for chat with authentication"""
-    with Session(engine) as session:
-        user = await get_user_from_token(token, session)
-        
+# Deliveries waiting on a queued message's commit, referenced until they finish
+_pending_deliveries: Set[asyncio.Task] = set()
+
+
+def _track(task: asyncio.Task) -> None:
+    _pending_deliveries.add(task)
+    task.add_done_callback(_pending_deliveries.discard)
+
+
+async def chat_audience(sender_id: int, receiver_id: Optional[int],
+                        chat_room_id: Optional[int]) -> Tuple[FrozenSet[int], List[int]]:
+    """
+    Members of the room a message goes to, and those of them to notify.
+
+    Offline members get a stored notification; online ones get the message
+    over their socket. Private messages (with a receiver) have no room
+    audience. Raises LookupError for an unknown room and PermissionError
+    if the sender isn't a member.
+    """
+    if receiver_id or not chat_room_id:
+        return frozenset(), []
+    members = await load_room_members(chat_room_id)
+    if members is None:
+        raise LookupError("Chat room not found")
+    if sender_id not in members:
+        raise PermissionError("You are not a participant of this chat room")
+    return members, sorted(
+        user_id for user_id in members if user_id != sender_id and not manager.is_user_online(user_id)
+    )
+
+
+async def _deliver_when_stored(user_id: int, stored: "asyncio.Future[Dict]", client_id: Optional[str],
+                               room_member_ids: FrozenSet[int], notified_ids: List[int]) -> None:
+    """Ack-after-queue: deliver the message, with its id, once its batch commits"""
+    try:
+        chat = await stored
+    except Exception as e:
+        await manager.send_to_user(user_id, {
+            "type": "error",
+            "client_id": client_id,
+            "message": f"Error processing message: {str(e)}"
+        })
+        return
+    await manager.send_chat_notification(chat, client_id, room_member_ids, notified_ids)
+
+
+def _sign_in(token: str) -> Optional[int]:
+    """Authenticate the token and mark its user online; returns the user id"""
+    with Session(database.engine) as session:
+        user = get_user_from_token(token, session)
         if not user:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid authentication")
-            return
-        
+            return None
         user.is_online = True
         user.last_seen = datetime.now()
         session.add(user)
         session.commit()
+        return user.id
+
+
+@router.websocket("/chat")
+async def websocket_chat_endpoint(
+    websocket: WebSocket,
+    token: str = Query(...)
+):
+    """
+    WebSocket endpoint for chat with authentication.
+
+    Database work runs on the chat executor, so the receive loop (and every
+    other socket on this worker) never waits on a query.
+    """
+    user_id = await run_chat_db(_sign_in, token)
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid authentication")
+        return
+    
+    await manager.connect(websocket, user_id)
+    
+    try:
+        await manager.send_to_user(user_id, {
+            "type": "connected",
+            "message": "Connected to chat",
+            "user_id": user_id
+        })
+        await manager.send_unread_counts(user_id)
         
-        await manager.connect(websocket, user.id)
-        
-        try:
-            await manager.send_to_user(user.id, {
-                "type": "connected",
-                "message": "Connected to chat",
-                "user_id": user.id
-            })
-            
-            while True:
-                data = await websocket.receive_text()
-                try:
-                    message_data = json.loads(data)
-                    message_type = message_data.get("type")
-                    
-                    if message_type == "ping":
-                        await manager.send_to_user(user.id, {"type": "pong"})
-                    
-                    elif message_type == "chat_message":
-                        receiver_id = message_data.get("receiver_id")
-                        message_text = message_data.get("message")
-                        chat_room_id = message_data.get("chat_room_id")
-                        
-                        if not message_text:
-                            await manager.send_to_user(user.id, {
-                                "type": "error",
-                                "message": "Message cannot be empty"
-                            })
-                            continue
-                        
-                        with Session(engine) as msg_session:
-                            chat = Chat(
-                                message=message_text,
-                                sender_id=user.id,
-                                receiver_id=receiver_id,
-                                chat_room_id=chat_room_id,
-                                message_type=ChatType.PRIVATE if receiver_id else ChatType.GROUP,
-                                is_read=False,
-                                delivered_at=datetime.now()
-                            )
-                            msg_session.add(chat)
-                            msg_session.commit()
-                            msg_session.refresh(chat)
-                            
-                            await manager.send_chat_notification(chat)
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message_data = json.loads(data)
+                message_type = message_data.get("type")
+                
+                if message_type == "ping":
+                    await manager.send_to_user(user_id, {"type": "pong"})
+                
+                elif message_type == "presence_subscribe":
+                    connection = manager.connections.get(websocket)
+                    if connection:
+                        manager.send_to_connection(connection, manager.watch(connection, message_data.get("user_ids") or []))
+                
+                elif message_type == "presence_unsubscribe":
+                    connection = manager.connections.get(websocket)
+                    if connection:
+                        manager.unwatch(connection, message_data.get("user_ids"))
+                
+                elif message_type == "chat_message":
+                    receiver_id = message_data.get("receiver_id")
+                    message_text = message_data.get("message")
+                    chat_room_id = message_data.get("chat_room_id")
                     
-                except json.JSONDecodeError:
-                    await manager.send_to_user(user.id, {
-                        "type": "error",
-                        "message": "Invalid JSON format"
-                    })
-                except Exception as e:
-                    await manager.send_to_user(user.id, {
-                        "type": "error",
-                        "message": f"Error processing message: {str(e)}"
-                    })
+                    if not message_text:
+                        await manager.send_to_user(user_id, {
+                            "type": "error",
+                            "message": "Message cannot be empty"
+                        })
+                        continue
                     
-        except WebSocketDisconnect:
-            pass
-        except Exception as e:
-            raise e
-        finally:
-            with Session(engine) as final_session:
-                final_user = final_session.get(User, user.id)
-                if final_user:
-                    final_user.is_online = False
-                    final_user.last_seen = datetime.now()
-                    final_session.add(final_user)
-                    final_session.commit()
-            await manager.disconnect(websocket)
+                    client_id = message_data.get("client_id")
+                    members, offline = await chat_audience(user_id, receiver_id, chat_room_id)
+                    if chat_writer.enabled and CHAT_ACK_MODE == "queue":
+                        stored = await chat_writer.submit(
+                            chat_row(user_id, message_text, receiver_id, chat_room_id),
+                            chat_recipients(receiver_id, offline)
+                        )
+                        await manager.send_to_user(user_id, {"type": "message_queued", "client_id": client_id})
+                        _track(asyncio.create_task(_deliver_when_stored(user_id, stored, client_id, members, offline)))
+                    else:
+                        chat = await persist_chat_message(user_id, message_text, receiver_id, chat_room_id, offline)
+                        await manager.send_chat_notification(chat, client_id, members, offline)
+                
+            except json.JSONDecodeError:
+                await manager.send_to_user(user_id, {
+                    "type": "error",
+                    "message": "Invalid JSON format"
+                })
+            except Exception as e:
+                await manager.send_to_user(user_id, {
+                    "type": "error",
+                    "message": f"Error processing message: {str(e)}"
+                })
+                
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        raise e
+    finally:
+        await manager.disconnect(websocket)
+        await run_chat_db(set_user_online, user_id, False)
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):